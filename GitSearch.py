@@ -4,27 +4,151 @@ import os
 import stat
 import shutil
 import subprocess
+import tempfile
 import csv
 import datetime
-from collections import defaultdict
+import functools
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from prettytable import PrettyTable
 from termcolor import colored
-from pydriller import Repository
+try:
+    import resource
+except ImportError:
+    resource = None
 
-TOKENS = []
-CURRENT_TOKEN_INDEX = 0
+# GitHub tokens requests are spread over, comma-separated in GITHUB_TOKENS (the API is used anonymously without any)
+TOKENS = [token.strip() for token in os.environ.get('GITHUB_TOKENS', '').split(',') if token.strip()]
 
 GITHUB_HEADERS = {
     'X-GitHub-Api-Version': "2022-11-28",
     'user-agent': 'Mozilla/5.0 (Windows NT 6.3; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.193 Safari/537.36'
 }
 
-if (len(TOKENS)):
-    GITHUB_HEADERS['authorization'] = f"Bearer {TOKENS[CURRENT_TOKEN_INDEX]}"
+# on-disk cache of GitHub API responses replayed as conditional requests (304s don't count against the
+# rate limit), and the responses already fetched during this run
+HTTP_CACHE_DIR = './http_cache/'
+RESPONSE_MEMO = {}
+
+# remaining quota and reset time of each token per rate-limit resource (core, search, graphql), taken from
+# the X-RateLimit-* headers of its latest response, and until when a secondary rate limit blocks it
+TOKEN_STATES = []
+TOKEN_LOCK = threading.Lock()
+
+# REST and GraphQL endpoints, overridable to point at GitHub Enterprise or a local stand-in server
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_GRAPHQL_URL = os.environ.get(
+    'GITHUB_GRAPHQL_URL', f'{GITHUB_API_URL}/graphql')
+# where repos are cloned from, overridable like the API endpoints (e.g. a file:// directory of owner/repo clones)
+GITHUB_CLONE_URL = os.environ.get(
+    'GITHUB_CLONE_URL', 'https://github.com').rstrip('/')
+# with --graphql (and a token) profiles are resolved GRAPHQL_BATCH logins per query and forks are listed over GraphQL
+USE_GRAPHQL = False
+GRAPHQL_BATCH = 50
+GRAPHQL_USER_FIELDS = 'login email name location company websiteUrl bio twitterUsername createdAt updatedAt'
+
+# keep-alive session shared by every GitHub API call, API_JOBS bounds concurrent profile lookups
+API_JOBS = 8
+SESSION = requests.Session()
+# seconds to wait before each retry of a GitHub API request that failed to connect or got a 502/503/504
+API_RETRY_DELAYS = [1, 2, 4]
+
+# emails harvested from commit identities in expanded search, and the repos already scanned for them in this run
+EMAIL_REGEX = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,6}\b")
+SCANNED_REPOS = set()
+# --skipforks leaves forks out of expanded search; --uniquecommits harvests every commit once per run: repos analyzed
+# or scanned before leave their branch tips in SCANNED_TIPS so their forks are diffed against them, and the hashes
+# harvested so far are kept in HARVESTED_COMMITS
+SKIP_FORKS = False
+UNIQUE_COMMITS = False
+SCANNED_TIPS = {}
+HARVESTED_COMMITS = set()
+
+# one record per commit: fields split by \x1f, records by \x1e, name-status entries NUL-separated (-z)
+GIT_LOG_FORMAT = '%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%cn%x1f%ce%x1f%cI%x1f%B%x1f'
+CHANGE_TYPES = {'A': 'ADD', 'D': 'DELETE', 'M': 'MODIFY', 'R': 'RENAME', 'T': 'MODIFY'}
 
 COMBINING_OPTIONS = ['--combineall', '--combinerepo', '--combinefork']
 EXPANDING_OPTIONS = ['--expandedsearch',
                      '--escontributors', '--esforkers', '--esuser']
+MIRROR_CACHE_DIR = './bare_clones/'
+MIRROR_CACHE_SIZE = 20 * 1024 ** 3
+# size of each cached mirror, measured when it is cloned or fetched (or the first time eviction sees it)
+MIRROR_SIZES = {}
+FORK_NETWORK = False
+# with --partialclone mirrors for commit analysis skip file contents and mirrors for email harvesting skip trees
+# too; a cached mirror serves any purpose that needs no more than it has (MIRROR_FILTERS, most complete first)
+PARTIAL_CLONE = False
+ANALYSIS_CLONE_FILTER = 'blob:none'
+EMAIL_CLONE_FILTER = 'tree:0'
+MIRROR_FILTERS = [None, 'blob:none', 'tree:0']
+FORK_DIFF = False
+JOBS = 4
+
+# worker pools of the discover, clone and analyze stages, and how many queued tasks still use each mirror
+STAGE_POOLS = {}
+# owner/repo of every repo reported in this run (input repos and the parents of forks), so each is reported once
+VISITED_REPOS = set()
+MIRRORS_IN_USE = Counter()
+MIRRORS_LOCK = threading.Lock()
+# commits handed to the report database per write
+COMBINE_BATCH_SIZE = 1000
+COMBINE_LOCK = threading.Lock()
+COMBINED_CSV_FIELDS = ['owner/repo', 'username', 'repo_name', 'branch', 'modified_file', 'hash', 'author_name', 'author_email',
+                       'committer_name', 'committer_email', 'commit_date_utc', 'msg', 'full_path', 'change_type']
+
+# --metrics writes where the run spent its time as JSON: calls and seconds per phase, clone bytes and time,
+# API calls per endpoint, cache hits, the lowest rate-limit quota seen per resource and the peak memory
+METRICS_PATH = None
+METRICS = {"phases": {}, "clones": {}, "api_calls": Counter(), "cache_hits": Counter(),
+           "rate_limit": {"lowest_remaining": {}, "limit": {}, "rate_limited_responses": 0, "waits": 0, "wait_seconds": 0}}
+METRICS_LOCK = threading.Lock()
+
+# SQLite report store written next to the CSVs with --db (one connection shared by all workers)
+DB_PATH = None
+DB = None
+DB_LOCK = threading.Lock()
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (repo TEXT PRIMARY KEY, owner TEXT, name TEXT, url TEXT, fork INTEGER, forked_from TEXT, branches INTEGER,
+                                  earliest_commit_date TEXT, created_at TEXT, updated_at TEXT, pushed_at TEXT);
+CREATE TABLE IF NOT EXISTS forks (parent TEXT, repo TEXT, PRIMARY KEY (parent, repo));
+CREATE TABLE IF NOT EXISTS commits (hash TEXT PRIMARY KEY, author_name TEXT, author_email TEXT COLLATE NOCASE, committer_name TEXT,
+                                    committer_email TEXT COLLATE NOCASE, commit_date_utc TEXT, msg TEXT);
+CREATE TABLE IF NOT EXISTS commit_branches (repo TEXT, branch TEXT, hash TEXT, PRIMARY KEY (repo, branch, hash));
+CREATE TABLE IF NOT EXISTS file_changes (hash TEXT, path TEXT, modified_file TEXT, change_type TEXT, PRIMARY KEY (hash, path, change_type));
+CREATE TABLE IF NOT EXISTS contributors (repo TEXT, email TEXT COLLATE NOCASE, name TEXT, commit_count INTEGER, branches TEXT, authored INTEGER, committed INTEGER,
+                                         first_commit_date TEXT, last_commit_date TEXT, files_touched INTEGER, PRIMARY KEY (repo, email));
+CREATE TABLE IF NOT EXISTS users (repo TEXT, username TEXT, email TEXT COLLATE NOCASE, repo_name TEXT, name TEXT, location TEXT, company TEXT, website TEXT,
+                                  bio TEXT, twitter TEXT, user_created_at TEXT, user_updated_at TEXT, fork INTEGER, forked_from TEXT, repo_created_at TEXT,
+                                  branches INTEGER, PRIMARY KEY (repo, username, email));
+CREATE TABLE IF NOT EXISTS emails (repo TEXT, username TEXT, email TEXT COLLATE NOCASE, PRIMARY KEY (repo, email, username));
+CREATE INDEX IF NOT EXISTS commits_author_email ON commits (author_email);
+CREATE INDEX IF NOT EXISTS commits_committer_email ON commits (committer_email);
+CREATE INDEX IF NOT EXISTS commit_branches_hash ON commit_branches (hash);
+CREATE INDEX IF NOT EXISTS repos_owner_name ON repos (owner, name);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS emails_email ON emails (email);
+"""
+# columns added to tables of existing report databases when they are opened
+DB_UPGRADES = {"contributors": [("authored", "INTEGER"), ("committed", "INTEGER"), ("first_commit_date", "TEXT"),
+                                ("last_commit_date", "TEXT"), ("files_touched", "INTEGER")]}
+
+# every finished unit of work (repo reports, repo and fork analyses, profile lookups, expanded-search targets)
+# is appended to the run journal as it completes; --resume loads it into RESUMED so those units are skipped.
+# Units finished in the current run never go into RESUMED. Appends to the combined CSVs are journaled too
+# ("combined": the size of the CSV before the append), so --resume can cut off an append that was cut short
+JOURNAL_PATH = './reports/.journal.jsonl'
+JOURNAL_KINDS = ['repo', 'analysis', 'profile', 'target', 'combined']
+RESUMED = {kind: {} for kind in JOURNAL_KINDS}
+JOURNAL_LOCK = threading.Lock()
+RESUME = False
+
 COMBINING_OPTION = ""
 EXPANDING_OPTION = ""
 USER_FOR_EXPANDED_SEARCH = ""
@@ -41,6 +165,11 @@ if len(sys.argv) < 2 or sys.argv[1] == '--help' or sys.argv[1] == '-h':
         "\tpython {} https://github.com/user/repo https://github.com/user0/repo ...".format(sys.argv[0]), 'yellow'), colored("[option]", "red"))
     print(
         colored("\tpython {} path/to/repo-links-file.txt".format(sys.argv[0]), 'yellow'), colored("[option]", "red"))
+    print(colored("\nquery the report database written with --db:", 'magenta'))
+    print(colored(
+        "\tpython {} query email someone@example.com".format(sys.argv[0]), 'yellow'), colored("[--db path]", "red"))
+    print(colored(
+        "\tpython {} query repo owner/repo".format(sys.argv[0]), 'yellow'), colored("[--db path]", "red"))
     print(colored("\n--combineall", "red"),
           colored("\t\tcombine all repos with their forks as well as their branches into one CSV", 'magenta'))
     print(colored("--combinerepo", "red"),
@@ -55,6 +184,36 @@ if len(sys.argv) < 2 or sys.argv[1] == '--help' or sys.argv[1] == '-h':
           colored("\tscan each branch of every repo of the each contributor user of the input repo to get emails from the commit history", 'magenta'))
     print(colored("--esuser", "red"), colored("username", "yellow"),
           colored("\tscan each branch of every repo of the exact user to get emails from the commit history", 'magenta'))
+    print(colored("--skipforks", "red"),
+          colored("\t\tleave repos that are forks out of the expanded search", 'magenta'))
+    print(colored("--uniquecommits", "red"),
+          colored("\tharvest each commit once in the expanded search: skip repos already analyzed and diff forks against their already scanned parent network", 'magenta'))
+    print(colored("--forknetwork", "red"),
+          colored("\tclone forks against the mirror of their parent repo so only objects unique to each fork are downloaded", 'magenta'))
+    print(colored("--forkdiff", "red"),
+          colored("\t\tskip forks that were never pushed to and report only commits of each fork that are not in its parent repo (implies --forknetwork)", 'magenta'))
+    print(colored("--jobs", "red"), colored("N", "yellow"),
+          colored("\t\tnumber of forks listed, cloned and analyzed at the same time in each stage (default 4)", 'magenta'))
+    print(colored("--apijobs", "red"), colored("N", "yellow"),
+          colored("\tnumber of GitHub API profile lookups made at the same time (default 8)", 'magenta'))
+    print(colored("--httpcache", "red"), colored("path", "yellow"),
+          colored("\tkeep GitHub API responses in this directory and revalidate them with conditional requests (default ./http_cache/)", 'magenta'))
+    print(colored("--nohttpcache", "red"),
+          colored("\t\tdon't keep GitHub API responses between runs", 'magenta'))
+    print(colored("--graphql", "red"),
+          colored("\t\tlook up profiles in batches and list forks over the GitHub GraphQL API (needs a token in GITHUB_TOKENS, falls back to REST otherwise)", 'magenta'))
+    print(colored("--db", "red"), colored("path", "yellow"),
+          colored("\t\talso write commits, file changes, contributors, users, forks and emails to this SQLite database", 'magenta'))
+    print(colored("--partialclone", "red"),
+          colored("\tclone without file contents (blob:none), and without trees for email harvesting (tree:0); renames are then only detected when the file is unchanged", 'magenta'))
+    print(colored("--resume", "red"),
+          colored("\t\tpick up a run that stopped where it left off: repos, forks, profiles and expanded-search repos finished before are skipped", 'magenta'))
+    print(colored("--metrics", "red"), colored("path", "yellow"),
+          colored("\twrite time per phase, clone bytes and time, API calls per endpoint, cache hits and rate-limit headroom of the run to this JSON file", 'magenta'))
+    print(colored("--cachedir", "red"), colored("path", "yellow"),
+          colored("\tkeep bare mirrors of cloned repos in this directory between runs (default ./bare_clones/)", 'magenta'))
+    print(colored("--cachesize", "red"), colored("GB", "yellow"),
+          colored("\tevict least recently used mirrors once the cache grows beyond this size (default 20)", 'magenta'))
     print()
     exit(0)
 
@@ -68,9 +227,6 @@ def getReposFromTXT(path):
 
 
 def search_github(url):
-    session = requests.Session()
-
-    # first_page = session.get(url, headers=GITHUB_HEADERS)
     first_page = make_request_to_github(url, returnRaw=True)
 
     if (first_page == None):
@@ -94,128 +250,1040 @@ def get_next_page(page):
     return page if page.headers.get('link') != None else None
 
 
-# GitHub API request helper - tokens setting and error handling
+# Size the connection pool of the shared session to the number of concurrent API lookups
+
+
+def configure_github_session():
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=API_JOBS, pool_maxsize=API_JOBS)
+    SESSION.mount('https://', adapter)
+    SESSION.mount('http://', adapter)
+
+
+# Send a GitHub API request over the shared session, retrying connection errors and transient server errors
+# (502/503/504) with backoff. Returns the last response, or None if the request never got one
+
+
+def send_to_github(method, url, **kwargs):
+    for delay in API_RETRY_DELAYS + [None]:
+        try:
+            response = SESSION.request(method, url, **kwargs)
+            if response.status_code not in [502, 503, 504] or delay is None:
+                return response
+            error = f"Status {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            if delay is None:
+                print(colored(f"[ERROR] Request to {url} Failed: {e}", 'red'))
+                return None
+            error = e
+        print(colored(
+            f"[INFO] Request to {url} Failed ({error}), Retrying in {delay}s...", 'magenta'))
+        time.sleep(delay)
+
+
+# Fetch several GitHub API urls concurrently over the shared session (at most API_JOBS at a time), results in input order
+
+
+def make_requests_to_github(urls):
+    with ThreadPoolExecutor(API_JOBS, thread_name_prefix="api") as pool:
+        return list(pool.map(make_request_to_github, urls))
+
+
+# GitHub API request helper - tokens setting and error handling. Each url is fetched once per run and
+# revalidated against the on-disk cache; rate-limited requests are retried with another token, or after
+# waiting for the earliest reset, so this only returns None if a request fails outright
 
 
 def make_request_to_github(url, returnRaw=False):
-    global CURRENT_TOKEN_INDEX
+    response = RESPONSE_MEMO.get(url)
+    if response is not None:
+        count_metric("cache_hits", "memo")
+    else:
+        response = fetch_from_github(url)
+        if response is None:
+            return None
+        if response.status_code == 200:
+            RESPONSE_MEMO[url] = response
+    if (returnRaw):
+        return response
+    response = response.json()
+    return response
+
+
+def fetch_from_github(url):
+    resource = get_rate_limit_resource(url)
+    cached = load_cached_response(url)
     while True:
-        response = requests.get(
-            url, headers=GITHUB_HEADERS)
-        if (response.status_code == 403):
-            if (CURRENT_TOKEN_INDEX+1 < len(TOKENS)):
-                CURRENT_TOKEN_INDEX += 1
-                print(colored(
-                    f"[INFO] Switching to Token {CURRENT_TOKEN_INDEX+1} ...", 'magenta'))
-                GITHUB_HEADERS['authorization'] = f"Bearer {TOKENS[CURRENT_TOKEN_INDEX]}"
-                continue
-            else:
-                print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
-                return None
-        else:
-            if (returnRaw):
-                return response
-            response = response.json()
-            return response
+        token_state = acquire_token(resource)
+        headers = dict(GITHUB_HEADERS)
+        if token_state["token"]:
+            headers['authorization'] = f"Bearer {token_state['token']}"
+        if cached and cached["etag"]:
+            headers['If-None-Match'] = cached["etag"]
+        elif cached and cached["last_modified"]:
+            headers['If-Modified-Since'] = cached["last_modified"]
+        response = send_to_github('GET', url, headers=headers)
+        if response is None:
+            return None
+        count_metric("api_calls", f"GET {get_api_endpoint(url)}")
+        record_rate_limit(token_state, resource, response)
+        if (response.status_code in [403, 429] and is_rate_limited(token_state, resource, response)):
+            continue
+        if response.status_code == 304 and cached:
+            count_metric("cache_hits", "http_304")
+            return build_cached_response(url, cached)
+        if response.status_code == 200:
+            store_cached_response(url, response)
+        return response
 
 
-# Write repo data to CSV based on repo_link parameter
+# Conditional-request cache: one JSON file per url with the body, the validators and the Link header used for paging
 
 
-def getRepoDataToCSV(repo_link, isFork=False, originalRepoUsername=None, originalRepoName=None):
-    username, repo_name = extractRepoAndUserFromURL(repo_link)
-    clone_path = './bare_clones/' + f'{username}__{repo_name}'
-    print(colored(
-        f"[INFO] Cloning {repo_link} Repo{' (Fork)' if isFork else ''}...", 'magenta'))
-    subprocess.getoutput(
-        'git clone --mirror {} {}'.format(repo_link, clone_path))
-    subprocess.getoutput(
-        f'git config --add safe.directory {clone_path}')
-    print(colored("[DONE]", 'green'))
-    out = subprocess.getoutput(
-        'cd {} && git branch'.format(clone_path))
-    branches = [b.strip('* ') for b in out.splitlines()]
-    if isFork:
-        all_repos[-1]["forks"][-1]["fork_link"] = repo_link
-        all_repos[-1]["forks"][-1]["branches"] = len(branches)
+def get_cached_response_path(url):
+    return os.path.join(HTTP_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_cached_response(url):
+    if not HTTP_CACHE_DIR:
+        return None
+    try:
+        with open(get_cached_response_path(url), encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached_response(url, response):
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not HTTP_CACHE_DIR or not (etag or last_modified):
+        return
+    path = get_cached_response_path(url)
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    with open(f'{path}.{threading.get_ident()}.tmp', "w", encoding="utf-8") as cache_file:
+        json.dump({"url": url, "etag": etag, "last_modified": last_modified, "headers": {key: response.headers[key] for key in ['Link', 'Content-Type'] if key in response.headers},
+                   "body": response.text}, cache_file)
+    os.replace(f'{path}.{threading.get_ident()}.tmp', path)
+
+
+def build_cached_response(url, cached):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = requests.structures.CaseInsensitiveDict(
+        cached["headers"])
+    response.encoding = 'utf-8'
+    response._content = cached["body"].encode('utf-8')
+    return response
+
+
+# GraphQL request helper - same token scheduling as make_request_to_github, returns the data of the response
+# (aliases that failed to resolve are None in it) or None if the whole query failed
+
+
+def make_graphql_request_to_github(query, variables=None):
+    while True:
+        token_state = acquire_token('graphql')
+        headers = dict(GITHUB_HEADERS)
+        if token_state["token"]:
+            headers['authorization'] = f"Bearer {token_state['token']}"
+        response = send_to_github('POST', GITHUB_GRAPHQL_URL, headers=headers, json={
+                                  "query": query, "variables": variables or {}})
+        if response is None:
+            return None
+        count_metric("api_calls", "POST /graphql")
+        record_rate_limit(token_state, 'graphql', response)
+        if (response.status_code in [403, 429] and is_rate_limited(token_state, 'graphql', response)):
+            continue
+        if response.status_code != 200:
+            print(colored(
+                f"[ERROR] GraphQL Request Failed with Status {response.status_code}", 'red'))
+            return None
+        body = response.json()
+        errors = body.get("errors") or []
+        if any(error.get("type") == 'RATE_LIMITED' for error in errors):
+            is_rate_limited(token_state, 'graphql', response)
+            continue
+        if not body.get("data"):
+            print(colored(
+                f"[ERROR] GraphQL Request Failed: {errors[0].get('message') if errors else body}", 'red'))
+            return None
+        return body["data"]
+
+
+def get_rate_limit_resource(url):
+    if '/graphql' in url:
+        return 'graphql'
+    if '/search/' in url:
+        return 'search'
+    return 'core'
+
+
+# Pick the token with the most quota left for the resource, or wait until the earliest one becomes usable again
+
+
+def acquire_token(resource):
+    while True:
+        with TOKEN_LOCK:
+            if not TOKEN_STATES:
+                TOKEN_STATES.extend({"token": token, "remaining": {}, "reset": {}, "blocked_until": 0}
+                                    for token in TOKENS or [None])
+            now = time.time()
+            available = []
+            for token_state in TOKEN_STATES:
+                if token_state["reset"].get(resource, 0) <= now:
+                    # rate-limit window is over, the quota is unknown until the next response
+                    token_state["remaining"].pop(resource, None)
+                if token_state["blocked_until"] <= now and token_state["remaining"].get(resource, 1) > 0:
+                    available.append(token_state)
+            if available:
+                token_state = max(available, key=lambda t: t["remaining"].get(
+                    resource, float('inf')))
+                if resource in token_state["remaining"]:
+                    token_state["remaining"][resource] -= 1
+                return token_state
+            wake_up = min(max(t["blocked_until"], t["reset"].get(resource, 0) if t["remaining"].get(resource, 1) <= 0 else 0)
+                          for t in TOKEN_STATES)
+        wait = max(1, wake_up - now + 1)
+        with METRICS_LOCK:
+            METRICS["rate_limit"]["waits"] += 1
+            METRICS["rate_limit"]["wait_seconds"] += wait
+        print(colored(
+            f"[INFO] Exceeded GitHub API rate-limit on All Tokens, Waiting {int(wait)} Seconds...", 'magenta'))
+        time.sleep(wait)
+
+
+def record_rate_limit(token_state, resource, response):
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    reset = response.headers.get('X-RateLimit-Reset')
+    if remaining is not None and reset is not None:
+        resource = response.headers.get('X-RateLimit-Resource', resource)
+        with TOKEN_LOCK:
+            token_state["remaining"][resource] = int(remaining)
+            token_state["reset"][resource] = int(reset)
+        with METRICS_LOCK:
+            lowest = METRICS["rate_limit"]["lowest_remaining"]
+            lowest[resource] = min(lowest.get(resource, int(remaining)), int(remaining))
+            if response.headers.get('X-RateLimit-Limit'):
+                METRICS["rate_limit"]["limit"][resource] = int(response.headers['X-RateLimit-Limit'])
+
+
+# Tell rate-limit responses from other 403s; a secondary rate limit blocks the token for Retry-After seconds (or a minute)
+
+
+def is_rate_limited(token_state, resource, response):
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None and response.headers.get('X-RateLimit-Remaining') != '0' and 'rate limit' not in response.text.lower():
+        return False
+    token_number = TOKEN_STATES.index(token_state) + 1
+    with METRICS_LOCK:
+        METRICS["rate_limit"]["rate_limited_responses"] += 1
+    if retry_after is not None or response.headers.get('X-RateLimit-Remaining') != '0':
+        wait = int(retry_after) if retry_after is not None and retry_after.isdigit() else 60
+        print(colored(
+            f"[INFO] Secondary rate-limit hit on Token {token_number}, Pausing It for {wait} Seconds ...", 'magenta'))
+        with TOKEN_LOCK:
+            token_state["blocked_until"] = time.time() + wait
     else:
-        all_repos[-1]["branches"] = len(branches)
-    commits = []
-    for branch in branches:
-        subprocess.getoutput(
-            "cd {} && git symbolic-ref HEAD refs/heads/'{}'".format(clone_path, branch))
-        for commit in Repository(clone_path).traverse_commits():
-            all_repos[-1]["contributors"][commit.author.email] = {"email": commit.author.email, "name": commit.author.name,
-                                                                  "commit_count": all_repos[-1]["contributors"][commit.author.email]["commit_count"] + 1 if all_repos[-1]["contributors"][commit.author.email] else 1, "branches": list(all_repos[-1]["contributors"][commit.author.email]["branches"]) + [branch] if branch not in list(all_repos[-1]["contributors"][commit.author.email]["branches"]) else all_repos[-1]["contributors"][commit.author.email]["branches"]}
-            for file in commit.modified_files:
-                commits.append({"branch": branch, "username": username, "repo_name": repo_name, "modified_file": file.filename, "hash": commit.hash,
-                                "author_name": commit.author.name, "author_email": commit.author.email, "committer_name": commit.committer.name, "committer_email": commit.committer.email, "commit_date_utc": commit.committer_date.astimezone(datetime.timezone.utc), "msg": commit.msg, "full_path": file.new_path, "change_type": file.change_type.name})
-    if (not isFork):
-        all_repos[-1]["earliest_commit_date"] = commits[0]["commit_date_utc"].astimezone(
-            datetime.timezone.utc)
+        print(colored(
+            f"[INFO] Exceeded GitHub API rate-limit on Token {token_number}, Switching Tokens ...", 'magenta'))
+        with TOKEN_LOCK:
+            # never trust a reset time that already passed (clock skew), or the token would be retried right away
+            token_state["remaining"][resource] = 0
+            token_state["reset"][resource] = max(
+                token_state["reset"].get(resource, 0), time.time() + 1)
+    return True
+
+
+# Run metrics for --metrics. Phases are timed per call and summed over the workers running them, so a phase
+# running on several threads can add up to more than the wall-clock time of the run. Memory is only reported as
+# the peak of the whole process: phases overlap on worker threads, so a per-phase figure would mean nothing, and
+# the rusage of git subprocesses includes the RSS they inherit when they are spawned
+
+
+def measure_phase(function):
+    @functools.wraps(function)
+    def measured(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with METRICS_LOCK:
+                phase = METRICS["phases"].setdefault(
+                    function.__name__, {"calls": 0, "seconds": 0})
+                phase["calls"] += 1
+                phase["seconds"] += time.perf_counter() - started
+    return measured
+
+
+def count_metric(kind, key):
+    with METRICS_LOCK:
+        METRICS[kind][key] += 1
+
+
+def record_clone_metric(kind, started, size):
+    seconds = time.perf_counter() - started
+    with METRICS_LOCK:
+        clones = METRICS["clones"].setdefault(
+            kind, {"count": 0, "seconds": 0, "bytes": 0})
+        clones["count"] += 1
+        clones["seconds"] += seconds
+        clones["bytes"] += max(0, size)
+
+
+# API endpoint of a url with the user and repo names left out (e.g. /repos/{owner}/{repo}/forks)
+
+
+def get_api_endpoint(url):
+    parts = url[len(GITHUB_API_URL):].split('?')[0].strip('/').split('/')
+    if parts[0] == 'users' and len(parts) > 1:
+        parts[1] = '{user}'
+    elif parts[0] == 'repos' and len(parts) > 2:
+        parts[1:3] = ['{owner}', '{repo}']
+    return '/' + '/'.join(parts)
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+def write_metrics(path, total_seconds):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with METRICS_LOCK:
+        metrics = {**METRICS, "total_seconds": total_seconds,
+                   "peak_rss_mb": get_peak_rss_mb()}
+    with open(path, "w", encoding="utf-8") as metrics_file:
+        json.dump(metrics, metrics_file, indent=2)
+
+
+# Write repo data to CSV based on repo_link parameter and return what the write stage merges into
+# all_repos (branch count, commit contributors and earliest commit date). Rows are streamed from git
+# straight into the repo's CSV and a staging file for the combined CSV, so memory stays flat however long the
+# history is. The staged rows are appended to the combined CSV in the same step as the analysis is journaled,
+# so an analysis cut short by a crash leaves nothing in the combined CSV for --resume to append again. If git
+# can't read the whole history the repo's CSVs are removed and the result is marked failed instead of journaled
+
+
+@measure_phase
+def getRepoDataToCSV(repo_link, isFork=False, originalRepoUsername=None, originalRepoName=None, reference=None, exclude=None, clone_path=None):
+    username, repo_name = extractRepoAndUserFromURL(repo_link)
+    if clone_path is None:
+        clone_path = get_mirror(repo_link, isFork, reference,
+                                get_clone_filter(ANALYSIS_CLONE_FILTER))
+    branches = get_branches(clone_path)
+    stats = {"contributors": ContributorStats(), "earliest_commit_date": None}
+    commits = traverse_branch_commits(clone_path, branches, exclude)
+    if DB is not None:
+        commits = storeCommitsInDB(commits, f"{username}/{repo_name}")
+    rows = iterCommitRows(commits, username, repo_name, stats)
 
     pathToCSV = f"reports/{originalRepoUsername}__{originalRepoName}/forks/{username}__{repo_name}.csv" if isFork else f"reports/{username}__{repo_name}/{username}__{repo_name}.csv"
+    combinedPathToCSV = getCombinedPathToCSV(
+        isFork, originalRepoUsername, originalRepoName)
     os.makedirs(os.path.dirname(pathToCSV), exist_ok=True)
-    print(colored("[INFO] Getting Commit Data to CSV...", 'magenta'))
-    with open(pathToCSV, "w", newline='', encoding="utf-8") as csv_output_file:
-        writer = csv.DictWriter(
-            csv_output_file, fieldnames=['branch', 'modified_file', 'hash', 'author_name', 'author_email', 'committer_name', 'committer_email', 'commit_date_utc', 'msg', 'full_path', 'change_type'], extrasaction='ignore')
+    print(colored(f"[INFO] Getting Commit Data of {username}/{repo_name} to CSV...", 'magenta'))
+    stagingPathToCSV = pathToCSV + ".combine.tmp" if combinedPathToCSV else os.devnull
+    try:
+        with open(pathToCSV, "w", newline='', encoding="utf-8") as csv_output_file, open(stagingPathToCSV, "w", newline='', encoding="utf-8") as staging_file:
+            writer = csv.DictWriter(
+                csv_output_file, fieldnames=['branch', 'modified_file', 'hash', 'author_name', 'author_email', 'committer_name', 'committer_email', 'commit_date_utc', 'msg', 'full_path', 'change_type'], extrasaction='ignore')
+            combined_writer = csv.DictWriter(
+                staging_file, fieldnames=COMBINED_CSV_FIELDS, extrasaction='ignore')
 
-        writer.writeheader()
-        writer.writerows(commits)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                if combinedPathToCSV:
+                    combined_writer.writerow(
+                        {"owner/repo": f'{row["username"]}/{row["repo_name"]}', **row})
+    except subprocess.CalledProcessError as e:
+        print(colored(
+            f"[ERROR] Can't Read the History of {username}/{repo_name}, Leaving It Out of the Reports: {e.stderr}", 'red'))
+        for path in [pathToCSV, pathToCSV[:-len(".csv")] + ".contributors.csv"] + ([stagingPathToCSV] if combinedPathToCSV else []):
+            if os.path.isfile(path):
+                os.remove(path)
+        return {"repo_link": repo_link, "isFork": isFork, "branches": len(branches), "tips": None, "contributors": ContributorStats(),
+                "earliest_commit_date": None, "failed": True, "mirrors": [clone_path, reference] if reference else [clone_path]}
+    write_contributors_data_to_CSV(
+        pathToCSV[:-len(".csv")] + ".contributors.csv", stats["contributors"])
+    print(colored("[DONE]\n", 'green'))
+    result = {"repo_link": repo_link, "isFork": isFork, "branches": len(branches), "tips": [oid for _, oid in branches], "contributors": stats["contributors"],
+              "earliest_commit_date": stats["earliest_commit_date"]}
+    combine(stagingPathToCSV if combinedPathToCSV else None, combinedPathToCSV, get_analysis_key(
+        repo_link, f"https://github.com/{originalRepoUsername}/{originalRepoName}" if isFork else None), result)
+    return {**result, "mirrors": [clone_path, reference] if reference else [clone_path]}
+
+
+# Turn the commits of a repo into CSV rows (one per branch and modified file), tallying the commit
+# contributors and the earliest commit date into stats along the way
+
+
+def iterCommitRows(commits, username, repo_name, stats):
+    contributors = stats["contributors"]
+    for commit, commit_branches in commits:
+        contributors.add_commit(commit, commit_branches)
+        if stats["earliest_commit_date"] is None or commit["commit_date_utc"] < stats["earliest_commit_date"]:
+            stats["earliest_commit_date"] = commit["commit_date_utc"]
+        for branch in commit_branches:
+            for file in commit["modified_files"]:
+                yield {"branch": branch, "username": username, "repo_name": repo_name, "hash": commit["hash"], "author_name": commit["author_name"], "author_email": commit["author_email"],
+                       "committer_name": commit["committer_name"], "committer_email": commit["committer_email"], "commit_date_utc": commit["commit_date_utc"], "msg": commit["msg"], **file}
+
+
+# Commit contributors of a repo by email. Each identity keeps the commits it authored (commit_count counts
+# them once per branch containing them, like the report always did) and committed, its first and last commit
+# date, and the branches and files of the commits it authored. Identities that only committed stay out of
+# authors(). Stats of forks and parallel workers merge into one another, and to_json()/from_json() carry
+# them through the run journal
+
+
+class Contributor:
+    __slots__ = ("email", "name", "commit_count", "authored", "committed",
+                 "first_commit_date", "last_commit_date", "branches", "files")
+
+    def __init__(self, email, name):
+        self.email = email
+        self.name = name
+        self.commit_count = 0
+        self.authored = 0
+        self.committed = 0
+        self.first_commit_date = None
+        self.last_commit_date = None
+        self.branches = set()
+        self.files = set()
+
+    def add_dates(self, first, last):
+        if first is not None and (self.first_commit_date is None or first < self.first_commit_date):
+            self.first_commit_date = first
+        if last is not None and (self.last_commit_date is None or last > self.last_commit_date):
+            self.last_commit_date = last
+
+    def merge(self, other):
+        self.commit_count += other.commit_count
+        self.authored += other.authored
+        self.committed += other.committed
+        self.add_dates(other.first_commit_date, other.last_commit_date)
+        self.branches |= other.branches
+        self.files |= other.files
+
+    def to_json(self):
+        return {"email": self.email, "name": self.name, "commit_count": self.commit_count, "authored": self.authored, "committed": self.committed,
+                "first_commit_date": self.first_commit_date.isoformat() if self.first_commit_date else None,
+                "last_commit_date": self.last_commit_date.isoformat() if self.last_commit_date else None,
+                "branches": sorted(self.branches), "files": sorted(self.files)}
+
+    @classmethod
+    def from_json(cls, data):
+        contributor = cls(data["email"], data["name"])
+        contributor.commit_count = data["commit_count"]
+        contributor.authored = data["authored"]
+        contributor.committed = data["committed"]
+        contributor.add_dates(*(datetime.datetime.fromisoformat(data[key]) if data[key] else None
+                                for key in ["first_commit_date", "last_commit_date"]))
+        contributor.branches = set(data["branches"])
+        contributor.files = set(data["files"])
+        return contributor
+
+
+class ContributorStats:
+    __slots__ = ("contributors",)
+
+    def __init__(self):
+        self.contributors = {}
+
+    def __len__(self):
+        return len(self.contributors)
+
+    def __iter__(self):
+        return iter(self.contributors.values())
+
+    def get(self, email, name):
+        contributor = self.contributors.get(email)
+        if contributor is None:
+            contributor = self.contributors[email] = Contributor(email, name)
+        return contributor
+
+    def authors(self):
+        return [contributor for contributor in self.contributors.values() if contributor.authored]
+
+    def add_commit(self, commit, commit_branches):
+        date = commit["commit_date_utc"]
+        author = self.get(commit["author_email"], commit["author_name"])
+        author.commit_count += len(commit_branches)
+        author.authored += 1
+        author.add_dates(date, date)
+        author.branches.update(commit_branches)
+        author.files.update(file["full_path"] or file["old_path"]
+                            for file in commit["modified_files"])
+        committer = self.get(commit["committer_email"], commit["committer_name"])
+        committer.committed += 1
+        committer.add_dates(date, date)
+
+    def merge(self, other):
+        for contributor in other:
+            self.get(contributor.email, contributor.name).merge(contributor)
+
+    def to_json(self):
+        return [contributor.to_json() for contributor in self]
+
+    @classmethod
+    def from_json(cls, data):
+        stats = cls()
+        for contributor in data:
+            stats.contributors[contributor["email"]] = Contributor.from_json(contributor)
+        return stats
+
+
+# Pass commits through while writing them, their branches and file changes to the report store in batches.
+# The repo's branch membership is replaced, so reruns reflect deleted branches instead of piling up rows
+
+
+def storeCommitsInDB(commits, repo):
+    write_to_db("DELETE FROM commit_branches WHERE repo = ?", [(repo,)])
+    batch = []
+    for commit, commit_branches in commits:
+        batch.append((commit, commit_branches))
+        if len(batch) == COMBINE_BATCH_SIZE:
+            storeCommitBatchInDB(batch, repo)
+            batch = []
+        yield commit, commit_branches
+    storeCommitBatchInDB(batch, repo)
 
+
+def storeCommitBatchInDB(batch, repo):
+    if not batch:
+        return
+    with DB_LOCK:
+        DB.executemany("INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)", [(commit["hash"], commit["author_name"], commit["author_email"], commit["committer_name"],
+                                                                                      commit["committer_email"], commit["commit_date_utc"].isoformat(), commit["msg"]) for commit, _ in batch])
+        DB.executemany("INSERT OR IGNORE INTO commit_branches VALUES (?, ?, ?)", [
+                       (repo, branch, commit["hash"]) for commit, commit_branches in batch for branch in commit_branches])
+        DB.executemany("INSERT OR IGNORE INTO file_changes VALUES (?, ?, ?, ?)", [(commit["hash"], file["full_path"] or file["old_path"], file["modified_file"], file["change_type"])
+                                                                                  for commit, _ in batch for file in commit["modified_files"]])
+        DB.commit()
+
+
+# Combined CSV the rows of a repo or fork also go to, based on provided combining option (None if they don't)
+
+
+def getCombinedPathToCSV(isFork, originalRepoUsername, originalRepoName):
     if COMBINING_OPTION == "combineall":
-        combine(commits, "reports/all.csv")
+        return "reports/all.csv"
     elif COMBINING_OPTION == "combinerepo" and not isFork:
-        combine(commits, "reports/all_repo.csv")
+        return "reports/all_repo.csv"
     elif COMBINING_OPTION == "combinefork" and isFork:
-        combine(
-            commits, f"reports/{originalRepoUsername}__{originalRepoName}/forks/all_forks.csv")
+        return f"reports/{originalRepoUsername}__{originalRepoName}/forks/all_forks.csv"
+    return None
 
-    print(colored("[DONE]\n", 'green'))
+
+# Write stage: merge the result of a repo (or of one of its forks) into its all_repos record
+
+
+def writeRepoResult(repo_record, result, fork_record=None):
+    if fork_record is not None:
+        fork_record["branches"] = result["branches"]
+    else:
+        repo_record["branches"] = result["branches"]
+        repo_record["earliest_commit_date"] = result["earliest_commit_date"]
+    repo_record["contributors"].merge(result["contributors"])
+    username, repo_name = extractRepoAndUserFromURL(result["repo_link"])
+    if result["tips"] is not None:
+        SCANNED_TIPS[f"{username}/{repo_name}".lower()] = result["tips"]
+    write_to_db("INSERT OR REPLACE INTO contributors VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(f"{username}/{repo_name}", c.email, c.name, c.commit_count, json.dumps(sorted(c.branches)), c.authored, c.committed,
+                                                                                         c.first_commit_date.isoformat() if c.first_commit_date else None, c.last_commit_date.isoformat() if c.last_commit_date else None, len(c.files))
+                                                                                        for c in result["contributors"]])
+
+    with MIRRORS_LOCK:
+        MIRRORS_IN_USE.subtract(result["mirrors"])
+        keep = [path for path, count in MIRRORS_IN_USE.items() if count > 0]
+    evict_mirror_cache(keep)
+
+
+# Clone stage: bring the mirror up to date, then hand the repo over to the analyze stage. Returns the future of the analysis
+
+
+def submitRepoTask(repo_link, isFork=False, originalRepoUsername=None, originalRepoName=None, reference=None, exclude=None, parent_clone=None):
+    with MIRRORS_LOCK:
+        MIRRORS_IN_USE.update(
+            [get_mirror_path(repo_link, get_clone_filter(ANALYSIS_CLONE_FILTER)), reference] if reference else [get_mirror_path(repo_link, get_clone_filter(ANALYSIS_CLONE_FILTER))])
+    return STAGE_POOLS["clone"].submit(cloneStage, repo_link, isFork, originalRepoUsername, originalRepoName, reference, exclude, parent_clone)
+
+
+def cloneStage(repo_link, isFork, originalRepoUsername, originalRepoName, reference, exclude, parent_clone):
+    if parent_clone is not None:
+        # the parent was submitted to the clone pool first, so it is already being cloned by another worker
+        parent_clone.result()
+    clone_path = get_mirror(repo_link, isFork, reference,
+                            get_clone_filter(ANALYSIS_CLONE_FILTER))
+    return STAGE_POOLS["analyze"].submit(getRepoDataToCSV, repo_link, isFork, originalRepoUsername, originalRepoName, reference, exclude, clone_path)
+
+
+# Run every input repo and its forks through the discover -> clone -> analyze -> write pipeline. Fork
+# discovery, clones and analyses run in bounded per-stage worker pools, so the clones of the next forks
+# overlap the analysis of the current ones; the write stage and the console report stay on the main thread
+# and follow the input order. The parent of a fork is reported right after it through the same pipeline,
+# unless it was reported already in this run
+
+
+def run_pipeline(repo_links):
+    for stage in ["discover", "clone", "analyze"]:
+        STAGE_POOLS[stage] = ThreadPoolExecutor(
+            JOBS, thread_name_prefix=stage)
+    try:
+        submitted = deque(submitRepo(repo_link)
+                          for repo_link in repo_links if visitRepo(repo_link))
+        while submitted:
+            repo_record, repo_clone, fork_tasks = submitted.popleft()
+            if fork_tasks is not None:
+                results = [collectRepoResult(
+                    get_analysis_key(repo_record["repo_link"]), repo_clone)]
+                writeRepoResult(repo_record, results[0])
+                for fork_record, fork_clone in fork_tasks.result():
+                    analysis_key = get_analysis_key(
+                        fork_record["fork_link"], repo_record["repo_link"])
+                    if fork_clone is not None or analysis_key in RESUMED["analysis"]:
+                        results.append(collectRepoResult(analysis_key, fork_clone))
+                        writeRepoResult(repo_record, results[-1], fork_record)
+                store_repo_record_in_db(repo_record)
+                first_user = len(users)
+                # a repo whose report was skipped or whose history (or a fork's) couldn't be read isn't
+                # journaled, so --resume looks it up again and redoes the failed analyses
+                if printRepoAndUserData(repo_record["repo_link"], repo_record) and not any(result.get("failed") for result in results):
+                    write_to_journal("repo", repo_record["repo_link"], {
+                                     "repo_record": repo_record, "users": users[first_user:]})
+            if repo_record.get("parent") and visitRepo(repo_record["parent"]):
+                print(colored(
+                    f'\n\n\n--------------------------------------------------PARENT REPO ({"/".join(extractRepoAndUserFromURL(repo_record["parent"]))})--------------------------------------------------\n\n\n', 'yellow'))
+                submitted.appendleft(submitRepo(repo_record["parent"]))
+    finally:
+        for pool in STAGE_POOLS.values():
+            pool.shutdown(cancel_futures=True)
+
+
+# Add a repo to all_repos and submit it and its fork discovery to the pipeline. Returns its record with the
+# future of its clone and of its fork discovery (None for repos a resumed run reported already)
+
+
+def submitRepo(repo_link):
+    if repo_link in RESUMED["repo"]:
+        print(colored(f"[INFO] Skipping {repo_link} Repo, Already Reported in the Resumed Run", 'magenta'))
+        all_repos.append(RESUMED["repo"][repo_link]["repo_record"])
+        users.extend(RESUMED["repo"][repo_link]["users"])
+        return RESUMED["repo"][repo_link]["repo_record"], None, None
+    repo_record = {"repo_link": repo_link,
+                   "forks": [], "contributors": ContributorStats()}
+    all_repos.append(repo_record)
+    if get_analysis_key(repo_link) in RESUMED["analysis"]:
+        # analyzed before the run stopped, the mirror is only needed again as the base of the forks
+        repo_clone = STAGE_POOLS["clone"].submit(get_mirror, repo_link, False, None, get_clone_filter(
+            ANALYSIS_CLONE_FILTER)) if FORK_NETWORK or FORK_DIFF else None
+    else:
+        repo_clone = submitRepoTask(repo_link)
+    return repo_record, repo_clone, STAGE_POOLS["discover"].submit(getForkDataToCSV, repo_link, repo_record, repo_clone)
+
+
+def visitRepo(repo_link):
+    username, repo_name = extractRepoAndUserFromURL(repo_link)
+    if f"{username}/{repo_name}".lower() in VISITED_REPOS:
+        return False
+    VISITED_REPOS.add(f"{username}/{repo_name}".lower())
+    return True
+
+
+# Result of the analysis of a repo or fork: replayed from the journal when a resumed run finished it
+# before (without mirrors, as nothing holds on to them any more), otherwise waited for
+
+
+def collectRepoResult(analysis_key, repo_clone):
+    if analysis_key in RESUMED["analysis"]:
+        return {**RESUMED["analysis"][analysis_key], "mirrors": []}
+    return repo_clone.result().result()
+
+
+# Journal key of an analysis: a repo analyzed as an input repo and as a fork of a parent (which may leave
+# out the parent's commits) are different units
+
+
+def get_analysis_key(repo_link, parent_link=None):
+    return f"{parent_link} fork {repo_link}" if parent_link else repo_link
+
+
+# Bring the cached bare mirror of a repo up to date and return its path: a cache miss clones the
+# repo, a hit only fetches what changed since the last run
+
+
+def get_mirror(repo_link, isFork=False, reference=None, clone_filter=None):
+    clone_path = get_mirror_path(repo_link, clone_filter)
+    if os.path.isdir(clone_path) and not all(map(os.path.isdir, get_alternates(clone_path))):
+        # the mirror it borrowed objects from is gone, so it can't be fetched into any more
+        remove_mirror(clone_path)
+    if reference and os.path.isdir(clone_path) and os.path.isdir(reference) and os.path.realpath(reference) not in map(os.path.realpath, get_alternates(clone_path)):
+        # cached without borrowing from the reference (e.g. by a run without --forknetwork): borrow from it now, so
+        # the parent's current branch tips the fork is diffed against are visible in the fork's mirror
+        os.makedirs(os.path.join(clone_path, 'objects', 'info'), exist_ok=True)
+        with open(os.path.join(clone_path, 'objects', 'info', 'alternates'), "a", encoding="utf-8") as alternates:
+            alternates.write(os.path.abspath(os.path.join(reference, 'objects')) + "\n")
+    for alternate in get_alternates(clone_path) + ([reference] if reference else []):
+        protect_borrowed_mirror(alternate)
+    size = MIRROR_SIZES.get(os.path.realpath(clone_path))
+    if size is None:
+        size = get_dir_size(clone_path) if METRICS_PATH else 0
+    started = time.perf_counter()
+    if os.path.isdir(clone_path):
+        print(colored(
+            f"[INFO] Fetching {repo_link} Repo{' (Fork)' if isFork else ''} into Cached Mirror...", 'magenta'))
+        subprocess.run(['git', '-C', clone_path, 'fetch', '--prune', '--quiet'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        count_metric("cache_hits", "mirror")
+        record_clone_metric("fetch", started, update_mirror_size(clone_path) - size)
+    else:
+        print(colored(
+            f"[INFO] Cloning {repo_link} Repo{' (Fork)' if isFork else ''}{' against ' + os.path.basename(reference) if reference else ''}...", 'magenta'))
+        os.makedirs(MIRROR_CACHE_DIR, exist_ok=True)
+        reference_args = ['--reference-if-able', os.path.abspath(reference)] if reference else []
+        filter_args = [f'--filter={clone_filter}'] if clone_filter else []
+        if subprocess.run(['git', 'clone', '--mirror', '--quiet', *reference_args, *filter_args, get_clone_url(repo_link), clone_path],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+            print(colored(f"[ERROR] Can't Clone {repo_link}", 'red'))
+            remove_mirror(clone_path)
+        else:
+            subprocess.getoutput(
+                f'git config --add safe.directory {clone_path}')
+            record_clone_metric("clone", started, update_mirror_size(clone_path))
+    if os.path.isdir(clone_path):
+        os.utime(clone_path)
+    print(colored("[DONE]", 'green'))
+    return clone_path
+
+
+# A mirror other mirrors borrow objects from must never drop objects: after the parent deletes or rewrites a
+# branch a fork still has, gc would prune the commits the fork's mirror relies on and leave it corrupt
+
+
+def protect_borrowed_mirror(path):
+    for key, value in [('gc.auto', '0'), ('gc.pruneExpire', 'never'), ('maintenance.auto', 'false')]:
+        subprocess.run(['git', '-C', path, 'config', key, value],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# Path of the cached mirror to use for a clone filter: the most complete cached mirror that is enough for it,
+# or where a new mirror with that filter goes
+
+
+def get_mirror_path(repo_link, clone_filter=None):
+    username, repo_name = extractRepoAndUserFromURL(repo_link)
+    clone_name = f'{username}__{repo_name}'.lower()
+    for mirror_filter in MIRROR_FILTERS[:MIRROR_FILTERS.index(clone_filter) + 1]:
+        clone_path = os.path.join(
+            MIRROR_CACHE_DIR, clone_name + (f"@{mirror_filter.replace(':', '-')}" if mirror_filter else ''))
+        if os.path.isdir(clone_path) or mirror_filter == clone_filter:
+            return clone_path
+
+
+def get_clone_filter(purpose):
+    return purpose if PARTIAL_CLONE else None
+
+
+# Repos whose object stores a mirror borrows from (objects/info/alternates written by --reference)
+
+
+def get_alternates(clone_path):
     try:
-        if not os.access('./bare_clones/', os.W_OK):
-            os.chmod('./bare_clones/', stat.S_IWRITE)
-        shutil.rmtree('./bare_clones/', ignore_errors=True)
+        with open(os.path.join(clone_path, 'objects', 'info', 'alternates'), encoding="utf-8") as alternates:
+            return [os.path.dirname(os.path.normpath(line.strip())) for line in alternates if line.strip() and not line.startswith('#')]
+    except OSError:
+        return []
+
+
+# Drop least recently used mirrors until the cache fits in MIRROR_CACHE_SIZE (mirrors in keep are never dropped).
+# Fork mirrors borrowing objects from a parent mirror are dropped together with it. Sizes come from MIRROR_SIZES,
+# so a call only lists the cache directory unless the cache is over its size.
+
+
+def evict_mirror_cache(keep=()):
+    if not os.path.isdir(MIRROR_CACHE_DIR):
+        return
+    mirrors = []
+    for entry in os.scandir(MIRROR_CACHE_DIR):
+        if entry.is_dir(follow_symlinks=False):
+            path = os.path.realpath(entry.path)
+            if path not in MIRROR_SIZES:
+                # left by an earlier run, measured once
+                MIRROR_SIZES[path] = get_dir_size(path)
+            mirrors.append((entry.stat().st_mtime, path))
+    total_size = sum(MIRROR_SIZES[path] for _, path in mirrors)
+    if total_size <= MIRROR_CACHE_SIZE:
+        return
+    keep = [os.path.realpath(path) for path in keep]
+    borrowers = defaultdict(list)
+    for _, path in mirrors:
+        for alternate in get_alternates(path):
+            borrowers[os.path.realpath(alternate)].append(path)
+    for _, path in sorted(mirrors):
+        if total_size <= MIRROR_CACHE_SIZE:
+            break
+        group = [path] + borrowers[path]
+        if not os.path.exists(path) or any(p in keep for p in group):
+            continue
+        for p in group:
+            if os.path.exists(p):
+                print(colored(f"[INFO] Evicting {os.path.basename(p)} from Mirror Cache...", 'magenta'))
+                total_size -= MIRROR_SIZES.get(p, 0)
+                remove_mirror(p)
+
+
+def update_mirror_size(path):
+    MIRROR_SIZES[os.path.realpath(path)] = get_dir_size(path)
+    return MIRROR_SIZES[os.path.realpath(path)]
+
+
+def get_dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def remove_mirror(path):
+    MIRROR_SIZES.pop(os.path.realpath(path), None)
+    if not os.path.exists(path):
+        return
+
+    def make_writable(func, path, _):
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    try:
+        shutil.rmtree(path, onerror=make_writable)
     except:
         print(colored(
             "[ERROR] Can't Delete Cloned Repo. Please Ensure You Run This Script in Admin Privileges", 'red'))
 
 
-# Generate combined CSV files based on provided combining option
+# List (branch, tip hash) pairs of a bare clone
 
 
-def combine(commits, path):
-    file_exists = os.path.isfile(path)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a", newline='', encoding="utf-8") as csv_output_file:
-        writer = csv.DictWriter(
-            csv_output_file, fieldnames=['owner/repo', 'username', 'repo_name', 'branch', 'modified_file', 'hash', 'author_name', 'author_email', 'committer_name', 'committer_email', 'commit_date_utc', 'msg', 'full_path', 'change_type'])
+def get_branches(clone_path):
+    out = subprocess.run(['git', '-C', clone_path, 'for-each-ref', '--format=%(objectname) %(refname)', 'refs/heads'],
+                         capture_output=True, text=True, encoding='utf-8', errors='replace').stdout
+    return [(ref[len('refs/heads/'):], oid) for oid, ref in (line.split(' ', 1) for line in out.splitlines())]
 
-        if not file_exists:
-            writer.writeheader()
-        for commit in commits:
-            commit["owner/repo"] = f'{commit["username"]}/{commit["repo_name"]}'
-            writer.writerow(commit)
 
+# Walk every branch of a bare clone in one git log pass and yield each commit once, with its file
+# changes and the branches that contain it. --topo-order emits children before parents, so a commit's
+# branch set is complete when it is reached and can be pushed down to its parents from there.
+# Commits reachable from any of the exclude hashes are left out. Partial mirrors have no file contents, so
+# only exact renames are detected there; similarity detection would fetch every blob lazily, and so would
+# reading the mailmap (HEAD:.mailmap in a bare repo), which the raw %an/%ae placeholders don't use anyway.
+# Raises CalledProcessError (with git's stderr) after the last commit if git log failed, as the history
+# read up to there may be incomplete
 
-# Write fork data to CSV based on repo_link parameter (uses getRepoDataToCSV function)
 
+def traverse_branch_commits(clone_path, branches, exclude=None):
+    masks = defaultdict(int)
+    for i, (branch, oid) in enumerate(branches):
+        masks[oid] |= 1 << i
+    branch_names = {}
+    stderr = tempfile.TemporaryFile(mode='w+', encoding='utf-8', errors='replace')
+    process = subprocess.Popen(['git', '-C', clone_path, 'log', '--branches', '--no-mailmap', '--topo-order', '-z', '-M100%' if PARTIAL_CLONE else '-M', '--name-status', f'--format={GIT_LOG_FORMAT}', '--ignore-missing', '--stdin'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding='utf-8', errors='replace')
+    if exclude:
+        process.stdin.write(''.join(f'^{oid}\n' for oid in exclude))
+    process.stdin.close()
+    for record in read_log_records(process.stdout):
+        commit = parse_log_record(record)
+        mask = masks.pop(commit["hash"], 0)
+        for parent in commit["parents"]:
+            masks[parent] |= mask
+        if mask not in branch_names:
+            branch_names[mask] = [branch for i, (branch, oid) in enumerate(branches) if mask >> i & 1]
+        yield commit, branch_names[mask]
+    check_git_log(process, stderr)
 
-def getForkDataToCSV(repo_link):
+
+# Wait for a git log process and raise CalledProcessError with its stderr if it failed
+
+
+def check_git_log(process, stderr):
+    with stderr:
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                process.returncode, process.args, stderr=stderr.read().strip())
+
+
+def read_log_records(stream):
+    buffer = ''
+    while True:
+        chunk = stream.read(1 << 16)
+        if not chunk:
+            break
+        records = (buffer + chunk).split('\x1e')
+        buffer = records.pop()
+        yield from filter(None, records)
+    if buffer:
+        yield buffer
+
+
+def parse_log_record(record):
+    header, _, changes = record.partition('\x1f\x00')
+    hash, parents, author_name, author_email, committer_name, committer_email, date, msg = header.split('\x1f', 7)
+    modified_files = []
+    tokens = changes.lstrip('\n').split('\x00')
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        status = tokens[i]
+        if status[0] in 'RC':
+            old_path, new_path = tokens[i + 1], tokens[i + 2]
+            i += 3
+        else:
+            old_path = new_path = tokens[i + 1]
+            i += 2
+        if status[0] == 'D':
+            new_path = None
+        modified_files.append({"modified_file": os.path.basename(new_path or old_path), "full_path": new_path, "old_path": old_path,
+                               "change_type": CHANGE_TYPES.get(status[0], 'UNKNOWN')})
+    return {"hash": hash, "parents": parents.split(), "author_name": author_name, "author_email": author_email, "committer_name": committer_name, "committer_email": committer_email,
+            "commit_date_utc": datetime.datetime.fromisoformat(date).astimezone(datetime.timezone.utc), "msg": msg.strip(), "modified_files": modified_files}
+
+
+# Append the staged rows of an analysis to a combined CSV file and journal the analysis in the same step (analyze
+# workers share these files, so one analysis at a time). The size of the CSV is journaled before the append and
+# after it with the analysis, so a resumed run cuts off whatever an append cut short by a crash left behind
+
+
+def combine(staging_path, path, analysis_key, result):
+    with COMBINE_LOCK:
+        if staging_path:
+            offset = os.path.getsize(path) if os.path.isfile(path) else 0
+            write_to_journal("combined", path, offset)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", newline='', encoding="utf-8") as csv_output_file, open(staging_path, newline='', encoding="utf-8") as staging_file:
+                if offset == 0:
+                    csv.DictWriter(csv_output_file,
+                                   fieldnames=COMBINED_CSV_FIELDS).writeheader()
+                shutil.copyfileobj(staging_file, csv_output_file, 1 << 20)
+            result = {**result, "combined": [path, os.path.getsize(path)]}
+        write_to_journal("analysis", analysis_key, result)
+    if staging_path:
+        os.remove(staging_path)
+
+
+# Cut each combined CSV back to its size after the last append the journal recorded as finished
+
+
+def truncate_combined_CSVs(offsets):
+    for path, offset in offsets.items():
+        if os.path.isfile(path) and os.path.getsize(path) > offset:
+            print(colored(
+                f"[INFO] Removing Rows of Unfinished Analyses from {path}...", 'magenta'))
+            with open(path, "r+b") as csv_file:
+                csv_file.truncate(offset)
+
+
+# Discover stage: list the forks of a repo and submit each one to the clone stage (uses getRepoDataToCSV function).
+# Returns (fork record, future of its clone) pairs in the order GitHub lists the forks
+
+
+@measure_phase
+def getForkDataToCSV(repo_link, repo_record, parent_clone):
     print(colored(f"[INFO] Getting Fork Data for {repo_link}...", 'magenta'))
-    forks = []
     username, repo_name = extractRepoAndUserFromURL(repo_link)
-    for page_data in search_github("https://api.github.com/repos/{}/{}/forks".format(
-            username, repo_name)):
-        forks.extend(page_data)
-    forks = [{"html_url": fork["html_url"], "created_at": fork["created_at"],
-              "updated_at": fork["updated_at"], "pushed_at": fork["pushed_at"]} for fork in forks]
+    forks = get_forks(username, repo_name)
     print(colored("[DONE]\n", 'green'))
+    # in fork-network mode every fork borrows the parent mirror's objects, so only what the fork adds is downloaded and stored
+    reference = get_mirror_path(repo_link, get_clone_filter(
+        ANALYSIS_CLONE_FILTER)) if FORK_NETWORK or FORK_DIFF else None
+    if reference:
+        parent_clone.result()
+    # in fork-diff mode commits reachable from the parent's branches are left out of the fork reports
+    exclude = [oid for _, oid in get_branches(reference)] if FORK_DIFF else None
+    fork_tasks = []
     for repo in forks:
-        all_repos[-1]["forks"].append({"created_at": repo["created_at"],
-                                       "updated_at": repo["updated_at"], "pushed_at": repo["pushed_at"]})
-        getRepoDataToCSV(repo["html_url"], True, username, repo_name)
+        fork_record = {"fork_link": repo["html_url"], "created_at": repo["created_at"],
+                       "updated_at": repo["updated_at"], "pushed_at": repo["pushed_at"]}
+        repo_record["forks"].append(fork_record)
+        if FORK_DIFF and not (repo["pushed_at"] and repo["pushed_at"] > repo["created_at"]):
+            print(colored(
+                f"[INFO] Skipping {repo['html_url']} Repo (Fork), Never Pushed To\n", 'magenta'))
+            fork_record.update({"branches": None, "skipped": True})
+            fork_tasks.append((fork_record, None))
+            continue
+        if get_analysis_key(repo["html_url"], repo_link) in RESUMED["analysis"]:
+            fork_tasks.append((fork_record, None))
+            continue
+        fork_tasks.append((fork_record, submitRepoTask(repo["html_url"], True, username,
+                                                       repo_name, reference, exclude, parent_clone if reference else None)))
+    return fork_tasks
+
+
+# List the forks of a repo with only the fields the report uses, over GraphQL when enabled or page by page over REST
+
+
+def get_forks(username, repo_name):
+    forks = []
+    if USE_GRAPHQL and TOKENS:
+        query = 'query($owner: String!, $name: String!, $cursor: String) { repository(owner: $owner, name: $name) { forks(first: 100, after: $cursor) { pageInfo { hasNextPage endCursor } nodes { url createdAt updatedAt pushedAt } } } }'
+        variables = {"owner": username, "name": repo_name, "cursor": None}
+        while True:
+            data = make_graphql_request_to_github(query, variables)
+            if not data or not data["repository"]:
+                break
+            page = data["repository"]["forks"]
+            forks.extend({"html_url": fork["url"], "created_at": fork["createdAt"], "updated_at": fork["updatedAt"],
+                          "pushed_at": fork["pushedAt"]} for fork in page["nodes"])
+            if not page["pageInfo"]["hasNextPage"]:
+                return forks
+            variables["cursor"] = page["pageInfo"]["endCursor"]
+        print(colored("[INFO] Listing Forks over GraphQL Failed, Falling Back to REST...", 'magenta'))
+        forks = []
+    for page_data in search_github("{}/repos/{}/{}/forks".format(GITHUB_API_URL,
+            username, repo_name)):
+        forks.extend(page_data)
+    return [{"html_url": fork["html_url"], "created_at": fork["created_at"],
+             "updated_at": fork["updated_at"], "pushed_at": fork["pushed_at"]} for fork in forks]
+
+
+# Look up GitHub profiles by login, shaped like the REST /users/{login} response. With GraphQL the logins are
+# resolved in batches of aliased user(login:) queries; logins GraphQL can't resolve (organizations) and every
+# login without a token go through REST
+
+
+def get_user_profiles(logins):
+    profiles = {login: RESUMED["profile"][login]
+                for login in logins if login in RESUMED["profile"]}
+    logins = [login for login in dict.fromkeys(logins) if login not in profiles]
+    if USE_GRAPHQL and TOKENS:
+        batches = [logins[i:i + GRAPHQL_BATCH]
+                   for i in range(0, len(logins), GRAPHQL_BATCH)]
+        with ThreadPoolExecutor(API_JOBS, thread_name_prefix="api") as pool:
+            for batch, data in zip(batches, pool.map(get_user_profiles_batch, batches)):
+                for i, login in enumerate(batch):
+                    user = (data or {}).get(f'u{i}')
+                    if user:
+                        profiles[login] = {"login": user["login"], "email": user["email"] or None, "name": user["name"], "location": user["location"], "company": user["company"], "blog": user["websiteUrl"] or "",
+                                           "bio": user["bio"] or None, "twitter_username": user["twitterUsername"], "created_at": user["createdAt"], "updated_at": user["updatedAt"]}
+    missing = [login for login in logins if login not in profiles]
+    profiles.update(zip(missing, make_requests_to_github(
+        [f'{GITHUB_API_URL}/users/{login}' for login in missing])))
+    for login in logins:
+        if profiles[login] is not None:
+            write_to_journal("profile", login, profiles[login])
+    return profiles
+
+
+def get_user_profiles_batch(logins):
+    query = '{ ' + ' '.join(f'u{i}: user(login: {json.dumps(login)}) {{ {GRAPHQL_USER_FIELDS} }}'
+                            for i, login in enumerate(logins)) + ' }'
+    return make_graphql_request_to_github(query)
 
 
 # Write all users of a repo to CSV file
@@ -234,6 +1302,19 @@ def write_users_data_to_CSV(users):
         writer.writerows(users)
 
 
+# Write the commit contributors of a repo or fork with their stats (next to its commit CSV)
+
+
+def write_contributors_data_to_CSV(path, contributors):
+    with open(path, "w", newline='', encoding="utf-8") as csv_output_file:
+        writer = csv.DictWriter(
+            csv_output_file, fieldnames=['email', 'name', 'commit_count', 'authored', 'committed', 'first_commit_date', 'last_commit_date', 'files_touched', 'branches'], extrasaction='ignore')
+
+        writer.writeheader()
+        writer.writerows({**c.to_json(), "files_touched": len(c.files), "branches": " ".join(sorted(c.branches))}
+                         for c in contributors)
+
+
 def write_emails_data_to_CSV(username, repo, emails):
     path = './reports/emails.csv'
     file_exists = os.path.isfile(path)
@@ -248,6 +1329,157 @@ def write_emails_data_to_CSV(username, repo, emails):
             {"username": username, "repo": repo, "emails": emails})
 
 
+# Report store helpers: every write is an upsert so reruns update rows instead of duplicating them
+
+
+def open_db(path):
+    global DB
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    DB = sqlite3.connect(path, check_same_thread=False)
+    DB.execute("PRAGMA journal_mode=WAL")
+    DB.executescript(DB_SCHEMA)
+    upgrade_db(DB)
+
+
+def upgrade_db(db):
+    for table, columns in DB_UPGRADES.items():
+        existing = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+        for column, column_type in columns:
+            if existing and column not in existing:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    db.commit()
+
+
+def write_to_db(statement, rows):
+    if DB is None:
+        return
+    with DB_LOCK:
+        DB.executemany(statement, rows)
+        DB.commit()
+
+
+def store_repo_record_in_db(repo_record):
+    username, repo_name = extractRepoAndUserFromURL(repo_record["repo_link"])
+    repo = f"{username}/{repo_name}"
+    write_to_db("INSERT INTO repos (repo, owner, name, url, branches, earliest_commit_date) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (repo) DO UPDATE SET branches = excluded.branches, earliest_commit_date = excluded.earliest_commit_date",
+                [(repo, username, repo_name, repo_record["repo_link"], repo_record.get("branches"), repo_record["earliest_commit_date"].isoformat() if repo_record.get("earliest_commit_date") else None)])
+    forks = []
+    for fork in repo_record["forks"]:
+        f_username, f_repo_name = extractRepoAndUserFromURL(fork["fork_link"])
+        forks.append((f"{f_username}/{f_repo_name}", f_username, f_repo_name, fork["fork_link"],
+                     repo, fork["branches"], fork["created_at"], fork["updated_at"], fork["pushed_at"]))
+    write_to_db("INSERT INTO repos (repo, owner, name, url, fork, forked_from, branches, created_at, updated_at, pushed_at) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?) ON CONFLICT (repo) DO UPDATE SET fork = 1, forked_from = excluded.forked_from, branches = COALESCE(excluded.branches, repos.branches), created_at = excluded.created_at, updated_at = excluded.updated_at, pushed_at = excluded.pushed_at",
+                forks)
+    write_to_db("INSERT OR IGNORE INTO forks VALUES (?, ?)",
+                [(repo, fork[0]) for fork in forks])
+
+
+def store_repo_metadata_in_db(repo_resp):
+    write_to_db("UPDATE repos SET fork = ?, forked_from = ?, created_at = ?, updated_at = ?, pushed_at = ? WHERE repo = ?",
+                [(int(repo_resp["fork"]), repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, repo_resp["created_at"], repo_resp["updated_at"], repo_resp["pushed_at"], repo_resp["full_name"])])
+
+
+def store_users_in_db(users):
+    write_to_db("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(user["repo"], user["username"] or '', user["email"] or '', user["repo_name"], user["name"], user.get("location"), user["company"], user.get("website"), user["bio"], user.get("twitter"),
+                  user["user_created_at"], user["user_updated_at"], int(bool(user["fork"])), user["forked_from"], user["repo_created_at"], user["branches"]) for user in users])
+
+
+def store_emails_in_db(username, repo, emails):
+    write_to_db("INSERT OR IGNORE INTO emails VALUES (?, ?, ?)", [
+                (f"{username}/{repo}", username, email) for email in emails if email])
+
+
+# Run journal: one JSON line per finished unit, dates written as ISO strings and contributors with to_json(). A fresh run starts an empty
+# journal, a resumed one loads it (a line cut short by a crash is ignored) and keeps appending to it
+
+
+def open_journal():
+    os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+    if not RESUME:
+        open(JOURNAL_PATH, "w", encoding="utf-8").close()
+        return
+    combined_offsets = {}
+    try:
+        with open(JOURNAL_PATH, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                RESUMED[entry["kind"]][entry["key"]] = entry["data"]
+                if entry["kind"] == "combined":
+                    combined_offsets[entry["key"]] = entry["data"]
+                elif entry["kind"] == "analysis" and entry["data"].get("combined"):
+                    path, offset = entry["data"]["combined"]
+                    combined_offsets[path] = offset
+    except OSError:
+        return
+    truncate_combined_CSVs(combined_offsets)
+    for repo in RESUMED["repo"].values():
+        parse_journal_record(repo["repo_record"])
+    for result in RESUMED["analysis"].values():
+        parse_journal_record(result)
+        username, repo_name = extractRepoAndUserFromURL(result["repo_link"])
+        SCANNED_TIPS[f"{username}/{repo_name}".lower()] = result["tips"]
+    print(colored(f"[INFO] Resuming Run: {len(RESUMED['repo'])} Repos, {len(RESUMED['analysis'])} Analyses, {len(RESUMED['profile'])} Profiles and {len(RESUMED['target'])} Expanded Search Repos Already Done", 'magenta'))
+
+
+def parse_journal_record(record):
+    record["contributors"] = ContributorStats.from_json(record["contributors"])
+    if record.get("earliest_commit_date"):
+        record["earliest_commit_date"] = datetime.datetime.fromisoformat(
+            record["earliest_commit_date"])
+
+
+def write_to_journal(kind, key, data):
+    line = json.dumps({"kind": kind, "key": key, "data": data},
+                      default=lambda value: value.to_json() if isinstance(value, ContributorStats) else value.isoformat())
+    with JOURNAL_LOCK:
+        with open(JOURNAL_PATH, "a", encoding="utf-8") as journal:
+            journal.write(line + "\n")
+
+
+# Answer questions from the report store: "email <address>" lists the repos where the address committed
+# or was harvested, "repo <owner/repo>" lists the contributors and forks of a repo
+
+
+def query_db(path, kind, value):
+    if not os.path.isfile(path):
+        print(colored(f"[ERROR] No Report Database at {path}", 'red'))
+        return
+    db = sqlite3.connect(path)
+    if kind == 'email':
+        table = PrettyTable(["repo", "commits", "authored", "committed", "first commit", "last commit"], max_width=45)
+        for row in db.execute("""SELECT cb.repo, COUNT(DISTINCT c.hash), COUNT(DISTINCT CASE WHEN c.author_email = :email THEN c.hash END),
+                                        COUNT(DISTINCT CASE WHEN c.committer_email = :email THEN c.hash END), MIN(c.commit_date_utc), MAX(c.commit_date_utc)
+                                 FROM commits c JOIN commit_branches cb ON cb.hash = c.hash
+                                 WHERE c.author_email = :email OR c.committer_email = :email GROUP BY cb.repo ORDER BY cb.repo""", {"email": value}):
+            table.add_row(row)
+        print(colored(f'\n--------------------REPOS WITH COMMITS BY {value}--------------------\n', 'green'))
+        print(table)
+        table = PrettyTable(["repo", "username"], max_width=45)
+        for row in db.execute("SELECT repo, username FROM emails WHERE email = ? ORDER BY repo", (value,)):
+            table.add_row(row)
+        print(colored(f'\n--------------------REPOS WHERE {value} WAS HARVESTED--------------------\n', 'green'))
+        print(table)
+    elif kind == 'repo':
+        upgrade_db(db)
+        table = PrettyTable(["email", "name", "commit count", "authored", "committed", "first commit", "last commit", "files touched", "branches"], max_width=45)
+        for row in db.execute("SELECT email, name, commit_count, authored, committed, first_commit_date, last_commit_date, files_touched, branches FROM contributors WHERE repo = ? ORDER BY commit_count DESC", (value,)):
+            table.add_row(row)
+        print(colored(f'\n--------------------CONTRIBUTORS OF {value}--------------------\n', 'green'))
+        print(table)
+        table = PrettyTable(["fork", "branches", "created at", "pushed at"], max_width=45)
+        for row in db.execute("SELECT r.repo, r.branches, r.created_at, r.pushed_at FROM forks f JOIN repos r ON r.repo = f.repo WHERE f.parent = ? ORDER BY r.repo", (value,)):
+            table.add_row(row)
+        print(colored(f'\n--------------------FORKS OF {value}--------------------\n', 'green'))
+        print(table)
+    else:
+        print(colored(f"[ERROR] Unknown Query {kind}, Use email or repo", 'red'))
+    db.close()
+
+
 def extractRepoAndUserFromURL(link):
     matches = link.split('github.com')[1].split('/')
     username = matches[1]
@@ -255,59 +1487,104 @@ def extractRepoAndUserFromURL(link):
     return username, repo_name
 
 
-# Clone original of all repos and their forks with all branches
+def get_clone_url(repo_link):
+    return GITHUB_CLONE_URL + repo_link.split('github.com', 1)[1]
+
+
+# Clone original of all repos and their forks with all branches. Working clones are made from the cached
+# mirrors (objects hardlinked where the filesystem allows, copied otherwise) instead of over the network,
+# in parallel, and every remote branch becomes a local branch at its remote tip in one ref transaction
 
 
+@measure_phase
 def cloneAllRepos():
-    wd = os.getcwd()
+    targets = []
     for repo in all_repos:
         username, repo_name = extractRepoAndUserFromURL(repo["repo_link"])
         clone_name = f'{username}__{repo_name}'
         mainPath = f"clones/{clone_name}"
         forksPath = f"{mainPath}/forks"
-        # os.makedirs(os.path.dirname(mainPath), exist_ok=True)
         os.makedirs(forksPath, exist_ok=True)
-        os.chdir(mainPath)
-        out = subprocess.getoutput(
-            f'git clone {repo["repo_link"]} {clone_name}')
-        os.chdir(clone_name)
-        branches = subprocess.getoutput(
-            f'git branch -r')
-        branches = list(map(lambda rb: rb[7:], [b.strip(
-            '* ') for b in branches.splitlines()][2:]))
-        for branch in branches:
-            subprocess.getoutput(
-                f"git branch '{branch}'")
-        print(colored(f"[INFO] {out}", 'magenta'))
-        os.chdir(wd)
+        targets.append((repo["repo_link"], False,
+                       os.path.join(mainPath, clone_name)))
         for fork in repo["forks"]:
+            if fork.get("skipped"):
+                continue
             f_username, f_repo_name = extractRepoAndUserFromURL(
                 fork["fork_link"])
-            fork_clone_name = f'{f_username}__{f_repo_name}'
-            os.chdir(forksPath)
-            out = subprocess.getoutput(
-                f'git clone {fork["fork_link"]} {fork_clone_name}')
-            os.chdir(fork_clone_name)
-            branches = subprocess.getoutput(
-                f'git branch -r')
-            branches = list(map(lambda rb: rb[7:], [b.strip(
-                '* ') for b in branches.splitlines()][2:]))
-            for branch in branches:
-                subprocess.run(
-                    f"git branch '{branch}'", shell=True)
-            print(colored(f"[INFO] {out}", 'magenta'))
-            os.chdir(wd)
-
-
-# Report helpful information about repo, forks, users, etc. on console
-
-
-def printRepoAndUserData(repo_link):
+            targets.append((fork["fork_link"], True, os.path.join(
+                forksPath, f'{f_username}__{f_repo_name}')))
+    with ThreadPoolExecutor(JOBS, thread_name_prefix="checkout") as pool:
+        list(pool.map(lambda target: materializeClone(*target), targets))
+
+
+# Make a working clone of a repo: a local clone of its full mirror, or with a partial (or evicted) mirror a
+# network clone that borrows whatever the mirror has. Clones never keep pointing into the mirror cache
+# (--dissociate), so evicting a mirror can't break them
+
+
+def materializeClone(repo_link, isFork, clone_path):
+    if os.path.exists(clone_path):
+        print(colored(f"[INFO] {clone_path} Already Exists, Skipping", 'magenta'))
+        return
+    print(colored(
+        f"[INFO] Cloning {repo_link} Repo{' (Fork)' if isFork else ''} into {clone_path}...", 'magenta'))
+    mirror_path = get_mirror_path(repo_link, ANALYSIS_CLONE_FILTER)
+    if not os.path.isdir(mirror_path):
+        mirror_path = None
+    partial = mirror_path is None or subprocess.run(['git', '-C', mirror_path, 'config', '--get', 'remote.origin.promisor'],
+                                                    capture_output=True, text=True).stdout.strip() == 'true'
+    if partial:
+        # working clones only need the blobs of the checked out commit, the rest is fetched on demand
+        filter_args = [f'--filter={ANALYSIS_CLONE_FILTER}'] if PARTIAL_CLONE else []
+        reference_args = ['--reference-if-able', os.path.abspath(mirror_path), '--dissociate'] if mirror_path else []
+        args = [*filter_args, *reference_args, get_clone_url(repo_link)]
+    else:
+        args = (['--dissociate'] if get_alternates(mirror_path) else []) + [os.path.abspath(mirror_path)]
+    started = time.perf_counter()
+    if subprocess.run(['git', 'clone', '--quiet', *args, clone_path],
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+        print(colored(f"[ERROR] Can't Clone {repo_link}", 'red'))
+        return
+    record_clone_metric("checkout", started, get_dir_size(
+        os.path.join(clone_path, '.git')) if METRICS_PATH else 0)
+    subprocess.run(['git', '-C', clone_path, 'remote', 'set-url', 'origin', repo_link],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    create_local_branches(clone_path)
+    print(colored(f"[DONE] {clone_path}", 'green'))
+
+
+# Create a local branch at the tip of every remote branch that has none yet, in one git update-ref transaction
+
+
+def create_local_branches(clone_path):
+    out = subprocess.run(['git', '-C', clone_path, 'for-each-ref', '--format=%(objectname) %(refname)', 'refs/heads', 'refs/remotes/origin'],
+                         capture_output=True, text=True, encoding='utf-8', errors='replace').stdout
+    refs = [line.split(' ', 1) for line in out.splitlines()]
+    local = {ref[len('refs/heads/'):] for _, ref in refs if ref.startswith('refs/heads/')}
+    remote_prefix = 'refs/remotes/origin/'
+    commands = ''.join(f'create refs/heads/{ref[len(remote_prefix):]} {oid}\n' for oid, ref in refs
+                       if ref.startswith(remote_prefix) and ref != remote_prefix + 'HEAD' and ref[len(remote_prefix):] not in local)
+    if commands:
+        subprocess.run(['git', '-C', clone_path, 'update-ref', '--stdin'], input=commands,
+                       text=True, encoding='utf-8', stdout=subprocess.DEVNULL)
+
+
+# Report helpful information about repo, forks, users, etc. on console. Returns False if the repo couldn't be
+# looked up on GitHub and its report was skipped
+
+
+@measure_phase
+def printRepoAndUserData(repo_link, repo_record):
     print(colored(
         f'\n\n\n----------------------------------------{repo_link.upper()}----------------------------------------\n\n\n', 'red'))
     username, repo_name = extractRepoAndUserFromURL(repo_link)
-    user_resp = make_request_to_github(
-        f'https://api.github.com/users/{username}')
+    user_resp, repo_resp = make_requests_to_github(
+        [f'{GITHUB_API_URL}/users/{username}', f"{GITHUB_API_URL}/repos/{username}/{repo_name}"])
+    if (repo_resp == None or repo_resp.get("full_name") == None):
+        print(colored(
+            f"[ERROR] Couldn't Get {username}/{repo_name} from the GitHub API, Skipping Its Report", 'red'))
+        return False
     if (user_resp == None):
         print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
     else:
@@ -317,57 +1594,54 @@ def printRepoAndUserData(repo_link):
                             user_resp["email"], user_resp["name"], user_resp["location"], user_resp["company"], user_resp["blog"], user_resp["bio"].replace("\r\n", " ") if user_resp["bio"] else None, user_resp["twitter_username"], user_resp["created_at"], user_resp["updated_at"]])
         print(colored('\n--------------------OWNER DATA--------------------\n', 'green'))
         print(user_table)
-    repo_resp = make_request_to_github(
-        f"https://api.github.com/repos/{username}/{repo_name}")
-    if (repo_resp == None):
-        print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
-    else:
-        repo_table = PrettyTable(
-            ["name", "description", "fork", "created at", "updated at", "pushed at", "earliest commit", "branches", "forks"])
-        repo_table._max_width = {"name": 15, "description": 15, "fork": 10,
-                                 "created at": 20, "updated at": 20, "pushed at": 20, "earliest commit": 20, "branches": 10, "forks": 10}
-        repo_table.add_row([repo_resp["full_name"], repo_resp["description"], repo_resp["fork"], repo_resp["created_at"],
-                            repo_resp["updated_at"], repo_resp["pushed_at"], all_repos[-1]["earliest_commit_date"], all_repos[-1]["branches"], repo_resp["forks"]])
-        print(colored('\n--------------------REPO DATA--------------------\n', 'green'))
-        print(repo_table)
-    users.append({"username": user_resp["login"], "repo_name": f"{username}/{repo_name}", "email": user_resp["email"], "name": user_resp["name"], "location": user_resp["location"], "company": user_resp["company"],
-                  "website": user_resp["blog"], "bio": user_resp["bio"], "twitter": user_resp["twitter_username"], "user_created_at": user_resp["created_at"], "user_updated_at": user_resp["updated_at"], "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": all_repos[-1]["branches"], "expanded_search": False})
+        users.append({"username": user_resp["login"], "repo_name": f"{username}/{repo_name}", "email": user_resp["email"], "name": user_resp["name"], "location": user_resp["location"], "company": user_resp["company"],
+                      "website": user_resp["blog"], "bio": user_resp["bio"], "twitter": user_resp["twitter_username"], "user_created_at": user_resp["created_at"], "user_updated_at": user_resp["updated_at"], "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": repo_record["branches"], "expanded_search": False})
+    repo_table = PrettyTable(
+        ["name", "description", "fork", "created at", "updated at", "pushed at", "earliest commit", "branches", "forks"])
+    repo_table._max_width = {"name": 15, "description": 15, "fork": 10,
+                             "created at": 20, "updated at": 20, "pushed at": 20, "earliest commit": 20, "branches": 10, "forks": 10}
+    repo_table.add_row([repo_resp["full_name"], repo_resp["description"], repo_resp["fork"], repo_resp["created_at"],
+                        repo_resp["updated_at"], repo_resp["pushed_at"], repo_record["earliest_commit_date"], repo_record["branches"], repo_resp["forks"]])
+    print(colored('\n--------------------REPO DATA--------------------\n', 'green'))
+    print(repo_table)
+    store_repo_metadata_in_db(repo_resp)
     contributors_resp = make_request_to_github(
         repo_resp["contributors_url"])
+    # look up the profiles of all contributors and forkers at once, each distinct login only once
+    profiles = get_user_profiles([user["login"] for user in contributors_resp or []] + [
+        extractRepoAndUserFromURL(fork["fork_link"])[0] for fork in repo_record["forks"]])
     if (contributors_resp == None):
         print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
     else:
         contributors_table = PrettyTable(
             ["username", "email", "name", "location", "company", "website", "bio", "twitter", "created at", "updated at"], max_width=15)
         for user in contributors_resp:
-            contributor_user_resp = make_request_to_github(
-                user["url"])
+            contributor_user_resp = profiles[user["login"]]
             if (contributor_user_resp == None):
                 print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
             else:
                 users.append({"username": contributor_user_resp["login"], "repo_name": f"{username}/{repo_name}", "email": contributor_user_resp["email"], "name": contributor_user_resp["name"], "location": contributor_user_resp["location"], "company": contributor_user_resp["company"],
-                              "website": contributor_user_resp["blog"], "bio": contributor_user_resp["bio"], "twitter": contributor_user_resp["twitter_username"], "user_created_at": contributor_user_resp["created_at"], "user_updated_at": contributor_user_resp["updated_at"], "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": all_repos[-1]["branches"], "expanded_search": True if EXPANDING_OPTION != "esforkers" else False})
+                              "website": contributor_user_resp["blog"], "bio": contributor_user_resp["bio"], "twitter": contributor_user_resp["twitter_username"], "user_created_at": contributor_user_resp["created_at"], "user_updated_at": contributor_user_resp["updated_at"], "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": repo_record["branches"], "expanded_search": True if EXPANDING_OPTION != "esforkers" else False})
                 contributors_table.add_row([contributor_user_resp["login"],
                                             contributor_user_resp["email"], contributor_user_resp["name"], contributor_user_resp["location"], contributor_user_resp["company"], contributor_user_resp["blog"], contributor_user_resp["bio"].replace("\r\n", " ") if contributor_user_resp["bio"] else None, contributor_user_resp["twitter_username"], contributor_user_resp["created_at"], contributor_user_resp["updated_at"]])
         print(colored(
             '\n--------------------CONTRIBUTORS DATA (GITHUB)--------------------\n', 'green'))
         print(contributors_table)
     commit_contributors_table = PrettyTable(
-        ["email", "name", "commit count"], max_width=45)
-    for cc in all_repos[-1]["contributors"].items():
-        users.append({"username": None, "repo_name": f"{username}/{repo_name}", "email": all_repos[-1]["contributors"][cc[0]]["email"], "name": all_repos[-1]["contributors"][cc[0]]["name"], "company": None,
-                      "bio": None, "user_created_at": None, "user_updated_at": None, "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": all_repos[-1]["branches"]})
+        ["email", "name", "commit count", "authored", "committed", "first commit", "last commit", "files touched"], max_width=45)
+    for cc in repo_record["contributors"].authors():
+        users.append({"username": None, "repo_name": f"{username}/{repo_name}", "email": cc.email, "name": cc.name, "company": None,
+                      "bio": None, "user_created_at": None, "user_updated_at": None, "repo": repo_link, "fork": repo_resp["fork"], "forked_from": repo_resp["parent"]["html_url"] if repo_resp["fork"] else None, "repo_created_at": repo_resp["created_at"], "branches": repo_record["branches"]})
         commit_contributors_table.add_row(
-            [all_repos[-1]["contributors"][cc[0]]["email"], all_repos[-1]["contributors"][cc[0]]["name"], all_repos[-1]["contributors"][cc[0]]["commit_count"]])
+            [cc.email, cc.name, cc.commit_count, cc.authored, cc.committed, cc.first_commit_date, cc.last_commit_date, len(cc.files)])
     print(colored(
         '\n--------------------CONTRIBUTORS DATA (COMMIT)--------------------\n', 'green'))
     print(commit_contributors_table)
     forks_table = PrettyTable(
         ["fork url", "fork date", "branches", "username", "email", "name", "location", "company", "website", "bio", "twitter", "created at", "updated at"], max_width=10)
-    for fork in all_repos[-1]["forks"]:
+    for fork in repo_record["forks"]:
         username, repo_name = extractRepoAndUserFromURL(fork["fork_link"])
-        fork_user_resp = make_request_to_github(
-            f'https://api.github.com/users/{username}')
+        fork_user_resp = profiles[username]
         if (fork_user_resp == None):
             print(colored("[ERROR] Exceeded GitHub API rate-limit", 'red'))
         else:
@@ -380,24 +1654,18 @@ def printRepoAndUserData(repo_link):
     print(forks_table)
     print(colored('\n\n\n--------------------------------------------------------------------------------------------------------------------------------------------\n\n\n', 'red'))
     if repo_resp["fork"]:
-        print(colored(
-            f'\n\n\n--------------------------------------------------PARENT REPO ({repo_resp["parent"]["full_name"]})--------------------------------------------------\n\n\n', 'yellow'))
-        subprocess.run(
-            f'python3 {sys.argv[0]} {repo_resp["parent"]["html_url"]}', shell=True)
-        print(colored(
-            f'\n\n\n------------------------------------------------------------------------------------------------------------------------------------------------------\n\n\n', 'yellow'))
+        # reported next by run_pipeline, in this process
+        repo_record["parent"] = repo_resp["parent"]["html_url"]
     write_users_data_to_CSV(users)
+    store_users_in_db(users)
+    return True
 
 
+@measure_phase
 def get_emails_from_users_repos():
     print(colored(
         "[INFO] Getting Emails from Repos", 'magenta'))
-    regex = "\\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,6}\\b"
-    toLowerCaseExpression = "{print tolower($0)}"
-    wd = os.getcwd()
     usernames = []
-    repos = []
-    emails = []
     if USER_FOR_EXPANDED_SEARCH:
         usernames = [USER_FOR_EXPANDED_SEARCH]
     else:
@@ -406,31 +1674,53 @@ def get_emails_from_users_repos():
                 user["username"]) if user["username"] and user["expanded_search"] == True and user["username"] not in usernames else True
 
     for username in usernames:
-        for page_data in search_github(f"https://api.github.com/users/{username}/repos"):
+        repos = []
+        for page_data in search_github(f"{GITHUB_API_URL}/users/{username}/repos"):
             repos.extend(page_data)
         for repo in repos:
-            repo_emails = []
             u = repo["owner"]["login"]
             r = repo["name"]
-            clone_path = 'bare_clones/' + f'{u}__{r}'
-            print(colored(
-                f"[INFO] Cloning {repo['html_url']} Repo...", 'magenta'))
-            subprocess.getoutput(
-                f'git clone --mirror {repo["html_url"]} {clone_path}')
-            subprocess.getoutput(
-                f'git config --add safe.directory {clone_path}')
-            print(colored("[DONE]", 'green'))
-            os.chdir(clone_path)
-            out = subprocess.getoutput('git branch')
-            branches = [b.strip('* ') for b in out.splitlines()]
-            for branch in branches:
-                emails_output = subprocess.getoutput(
-                    "git symbolic-ref HEAD refs/heads/'{}' && git shortlog -sea | grep -E -o '{}' | awk '{}' | uniq | grep -wv 'users.noreply.github.com' && git shortlog -sec | grep -E -o '{}' | awk '{}' | uniq | grep -wv 'users.noreply.github.com'".format(branch, regex, toLowerCaseExpression, regex, toLowerCaseExpression))
-                emails.extend(emails_output.split('\n'))
-                emails = list(set(emails))
-                repo_emails.extend(emails_output.split('\n'))
-                repo_emails = list(set(repo_emails))
-            os.chdir(wd)
+            full_name = repo["full_name"].lower()
+            if full_name in SCANNED_REPOS:
+                continue
+            SCANNED_REPOS.add(full_name)
+            if full_name in RESUMED["target"]:
+                print(colored(
+                    f"[INFO] Skipping {repo['html_url']} Repo, Already Scanned in the Resumed Run", 'magenta'))
+                if RESUMED["target"][full_name]["tips"] is not None:
+                    SCANNED_TIPS[full_name] = RESUMED["target"][full_name]["tips"]
+                continue
+            if SKIP_FORKS and repo["fork"]:
+                print(colored(
+                    f"[INFO] Skipping {repo['html_url']} Repo (Fork)", 'magenta'))
+                continue
+            if UNIQUE_COMMITS and full_name in SCANNED_TIPS:
+                print(colored(
+                    f"[INFO] Skipping {repo['html_url']} Repo, Its Commits Were Already Scanned", 'magenta'))
+                continue
+            reference, exclude = None, None
+            if UNIQUE_COMMITS and repo["fork"]:
+                # diff the fork against its network root if that was scanned already, borrowing the root's objects
+                source = (make_request_to_github(
+                    repo["url"]) or {}).get("source")
+                if source and source["full_name"].lower() in SCANNED_TIPS:
+                    reference = get_mirror_path(
+                        source["html_url"], get_clone_filter(EMAIL_CLONE_FILTER))
+                    exclude = SCANNED_TIPS[source["full_name"].lower()]
+            clone_path = get_mirror(
+                repo["html_url"], repo["fork"], reference, get_clone_filter(EMAIL_CLONE_FILTER))
+            repo_emails = harvest_emails(clone_path, exclude)
+            if repo_emails is None:
+                # not journaled, so --resume scans it again
+                print(colored(
+                    f"[ERROR] Skipping {repo['html_url']} Repo, Its Emails Couldn't Be Read", 'red'))
+                evict_mirror_cache(
+                    keep=[clone_path, reference] if reference else [clone_path])
+                continue
+            repo_emails = sorted(repo_emails)
+            if UNIQUE_COMMITS:
+                SCANNED_TIPS[full_name] = [
+                    oid for _, oid in get_branches(clone_path)]
             emails_table = PrettyTable(
                 ["username", "repo", "emails"], max_width=45)
             emails_table.add_row([u, r, repo_emails])
@@ -438,21 +1728,72 @@ def get_emails_from_users_repos():
             print(colored(
                 f"[INFO] Getting Email Data to CSV", 'magenta'))
             write_emails_data_to_CSV(u, r, repo_emails)
+            store_emails_in_db(u, r, repo_emails)
+            write_to_journal("target", full_name, {
+                             "emails": repo_emails, "tips": SCANNED_TIPS.get(full_name) if UNIQUE_COMMITS else None})
             print(colored("[DONE]", 'green'))
-            try:
-                if not os.access('./bare_clones/', os.W_OK):
-                    os.chmod('./bare_clones/', stat.S_IWRITE)
-                shutil.rmtree('./bare_clones/', ignore_errors=True)
-            except:
-                print(colored(
-                    "[ERROR] Can't Delete Cloned Repo. Please Ensure You Run This Script in Admin Privileges", 'red'))
+            evict_mirror_cache(
+                keep=[clone_path, reference] if reference else [clone_path])
     print(colored(
         "[DONE] Getting Emails from Repos Completed", 'green'))
 
 
+# Collect the author and committer emails of every branch of a bare clone in one git log pass. Each distinct
+# identity pair is matched once; emails are lowercased and GitHub noreply addresses are dropped. Commits reachable
+# from the exclude hashes, and with --uniquecommits commits harvested earlier in the run, are left out.
+# Returns None if git log failed, as the emails read up to there may be incomplete
+
+
+def harvest_emails(clone_path, exclude=None):
+    emails = set()
+    identities = set()
+    harvested = set()
+    stderr = tempfile.TemporaryFile(mode='w+', encoding='utf-8', errors='replace')
+    process = subprocess.Popen(['git', '-C', clone_path, 'log', '--branches', '--no-mailmap', '--format=%H%x00%an <%ae>%x00%cn <%ce>', '--ignore-missing', '--stdin'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding='utf-8', errors='replace')
+    if exclude:
+        process.stdin.write(''.join(f'^{oid}\n' for oid in exclude))
+    process.stdin.close()
+    for line in process.stdout:
+        hash, _, line = line.partition('\x00')
+        if UNIQUE_COMMITS:
+            hash = bytes.fromhex(hash)
+            if hash in HARVESTED_COMMITS:
+                continue
+            harvested.add(hash)
+        if line in identities:
+            continue
+        identities.add(line)
+        for identity in line.rstrip('\n').split('\x00'):
+            if 'users.noreply.github.com' in identity:
+                continue
+            emails.update(email.lower()
+                          for email in EMAIL_REGEX.findall(identity))
+    try:
+        check_git_log(process, stderr)
+    except subprocess.CalledProcessError as e:
+        print(colored(f"[ERROR] Can't Read the History of {clone_path}: {e.stderr}", 'red'))
+        return None
+    # only marked as harvested once the whole history was read
+    HARVESTED_COMMITS.update(harvested)
+    return emails
+
+
 if __name__ == "__main__":
-    print(colored("[INFO] Script Started", 'magenta'))
     arg = sys.argv[1]
+    if '--db' in sys.argv:
+        DB_PATH = sys.argv[sys.argv.index('--db') + 1]
+    if arg == 'query':
+        if len(sys.argv) < 4:
+            print(colored("[ERROR] Usage: query email|repo value [--db path]", 'red'))
+            exit(1)
+        query_db(DB_PATH or 'reports/gitsearch.db',
+                 sys.argv[2], sys.argv[3])
+        exit(0)
+    started = time.perf_counter()
+    print(colored("[INFO] Script Started", 'magenta'))
+    if DB_PATH:
+        open_db(DB_PATH)
     given_combining_options = list(
         filter(lambda o: o in COMBINING_OPTIONS, sys.argv))
     given_expanding_options = list(
@@ -463,23 +1804,47 @@ if __name__ == "__main__":
         EXPANDING_OPTION = given_expanding_options[0][2:]
         if (EXPANDING_OPTION == 'esuser'):
             USER_FOR_EXPANDED_SEARCH = sys.argv[sys.argv.index('--esuser') + 1]
+    SKIP_FORKS = '--skipforks' in sys.argv
+    UNIQUE_COMMITS = '--uniquecommits' in sys.argv
+    FORK_NETWORK = '--forknetwork' in sys.argv
+    PARTIAL_CLONE = '--partialclone' in sys.argv
+    FORK_DIFF = '--forkdiff' in sys.argv
+    RESUME = '--resume' in sys.argv
+    if '--jobs' in sys.argv:
+        JOBS = max(1, int(sys.argv[sys.argv.index('--jobs') + 1]))
+    if '--apijobs' in sys.argv:
+        API_JOBS = max(1, int(sys.argv[sys.argv.index('--apijobs') + 1]))
+    configure_github_session()
+    USE_GRAPHQL = '--graphql' in sys.argv
+    if USE_GRAPHQL and not TOKENS:
+        print(colored(
+            "[INFO] GraphQL API Needs a Token in GITHUB_TOKENS, Using REST API Instead", 'magenta'))
+    if '--httpcache' in sys.argv:
+        HTTP_CACHE_DIR = sys.argv[sys.argv.index('--httpcache') + 1]
+    if '--nohttpcache' in sys.argv:
+        HTTP_CACHE_DIR = None
+    if '--metrics' in sys.argv:
+        METRICS_PATH = sys.argv[sys.argv.index('--metrics') + 1]
+    if '--cachedir' in sys.argv:
+        MIRROR_CACHE_DIR = sys.argv[sys.argv.index('--cachedir') + 1]
+    if '--cachesize' in sys.argv:
+        MIRROR_CACHE_SIZE = int(
+            float(sys.argv[sys.argv.index('--cachesize') + 1]) * 1024 ** 3)
     repo_links = []
     if (not arg.startswith('https://') and arg.endswith('.txt')):
         repo_links = getReposFromTXT(arg)
     else:
         repo_links = list(
             filter(lambda o: 'github.com' in o, sys.argv[1:]))
-    for i, repo in enumerate(repo_links):
-        username, repo_name = extractRepoAndUserFromURL(repo)
-        repo = f"https://github.com/{username}/{repo_name}"
-        def recursive_dd(): return defaultdict(recursive_dd)
-        all_repos.append(
-            {"repo_link": repo, "forks": [], "contributors": recursive_dd()})
-        getRepoDataToCSV(repo)
-        getForkDataToCSV(repo)
-        printRepoAndUserData(repo)
+    repo_links = [
+        "https://github.com/{}/{}".format(*extractRepoAndUserFromURL(repo)) for repo in repo_links]
+    open_journal()
+    run_pipeline(repo_links)
     print(colored("[DONE] All Reports Generated\n", 'green'))
     print(colored("[INFO] Cloning Original of All Repos...\n", 'magenta'))
     cloneAllRepos()
     if EXPANDING_OPTION:
         get_emails_from_users_repos()
+    if METRICS_PATH:
+        write_metrics(METRICS_PATH, time.perf_counter() - started)
+        print(colored(f"[DONE] Run Metrics Written to {METRICS_PATH}", 'green'))
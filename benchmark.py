@@ -0,0 +1,391 @@
+import sys
+import os
+import json
+import time
+import shutil
+import subprocess
+import tempfile
+import threading
+import hashlib
+import re
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from prettytable import PrettyTable
+from termcolor import colored
+
+GITSEARCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GitSearch.py')
+PHASES = ['getRepoDataToCSV', 'getForkDataToCSV', 'printRepoAndUserData',
+          'cloneAllRepos', 'get_emails_from_users_repos']
+
+# shape of the synthetic repos and of the stand-in GitHub API, overridable from the command line
+CONFIG = {
+    "repos": 1,           # input repos
+    "commits": 500,       # commits on the default branch of each repo
+    "branches": 5,        # branches per repo, the default branch included
+    "overlap": 0.8,       # share of the default branch's history each other branch starts from
+    "files": 3,           # files changed per commit
+    "forks": 5,           # forks per repo, every other one with commits of its own
+    "forkcommits": 20,    # commits of a fork that pushed to it
+    "contributors": 10,   # distinct authors of the commits
+    "latency": 0.02,      # seconds the API server waits before each response
+    "ratelimit": 5000,    # API requests per rate-limit window (GitHub's authenticated default)
+    "ratewindow": 3600,   # length of a rate-limit window in seconds
+    "runs": 2,            # runs over the same work dir: the first starts cold, the next ones reuse the caches
+}
+BASE_TIMESTAMP = 1600000000
+PER_PAGE = 30
+
+# what the stand-in API server serves, filled by generate_repos()
+API_REPOS = {}
+API_USERS = {}
+API_USER_REPOS = {}
+API_STATE = {"requests": 0, "windows": {resource: {"start": 0, "used": 0} for resource in ['core', 'graphql']}}
+API_LOCK = threading.Lock()
+
+# checking if the parameter is correctly provided
+if len(sys.argv) > 1 and (sys.argv[1] == '--help' or sys.argv[1] == '-h'):
+    print()
+    print(colored("usage:\n", 'green'))
+    print(colored("\nbenchmark GitSearch against synthetic repos served over file:// and a local stand-in GitHub API:", 'magenta'))
+    print(colored(
+        "\tpython {}".format(sys.argv[0]), 'yellow'), colored("[option] [-- GitSearch options]", "red"))
+    print()
+    for key, value in CONFIG.items():
+        print(colored(f"--{key}", "red"), colored("N", "yellow"),
+              colored(f"\t(default {value})", 'magenta'))
+    print(colored("--output", "red"), colored("path", "yellow"),
+          colored("\twrite the config, the timings and the GitSearch metrics of every run to this JSON file (default benchmark.json)", 'magenta'))
+    print(colored("--baseline", "red"), colored("path", "yellow"),
+          colored("\tcompare the phase timings with an earlier --output file", 'magenta'))
+    print(colored("--workdir", "red"), colored("path", "yellow"),
+          colored("\tgenerate the repos and run GitSearch in this directory and keep it (default: a temporary directory that is removed)", 'magenta'))
+    print(colored("\nGitSearch options after -- replace the default --expandedsearch, e.g. -- --expandedsearch --forknetwork --graphql\n", 'magenta'))
+    exit(0)
+
+
+def timestamp(offset):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(BASE_TIMESTAMP + offset))
+
+
+# Write the commits of a synthetic repo with git fast-import. Each branch other than main starts from main at
+# the overlap point and gets the commits main has past it, so branch overlap drives how much history is shared
+
+
+def generate_repo(path, owner):
+    subprocess.run(['git', 'init', '--bare', '--quiet', path], check=True)
+    subprocess.run(['git', '-C', path, 'config', 'uploadpack.allowfilter', 'true'], check=True)
+    commits = CONFIG["commits"]
+    diverge = min(commits, max(1, int(commits * CONFIG["overlap"])))
+    stream = []
+    mark = 0
+    for branch in range(CONFIG["branches"]):
+        count = commits if branch == 0 else max(1, commits - diverge)
+        for i in range(count):
+            mark += 1
+            if i:
+                parent = mark - 1
+            else:
+                parent = diverge if branch else None
+            stream.append(fast_import_commit(
+                'main' if branch == 0 else f'branch-{branch}', mark, parent, mark, owner))
+    subprocess.run(['git', '-C', path, 'fast-import', '--quiet'],
+                   input=b''.join(stream), check=True)
+    subprocess.run(['git', '-C', path, 'symbolic-ref', 'HEAD', 'refs/heads/main'], check=True)
+
+
+# Add commits of a fork on a branch of its own, starting from the tip of main
+
+
+def add_fork_commits(path, owner):
+    stream = []
+    for i in range(CONFIG["forkcommits"]):
+        stream.append(fast_import_commit('fork-work', None, None if i else 'refs/heads/main^0',
+                                         CONFIG["commits"] * CONFIG["branches"] + i, owner))
+    subprocess.run(['git', '-C', path, 'fast-import', '--quiet'],
+                   input=b''.join(stream), check=True)
+
+
+def fast_import_commit(branch, mark, parent, serial, owner):
+    author = f'dev{serial % CONFIG["contributors"]}'
+    # one commit in ten is committed by someone else than its author, like merges made on GitHub
+    committer = f'{owner} <{owner}@example.com>' if serial % 10 == 0 else f'{author} <{author}@example.com>'
+    message = f'commit {serial} on {branch}\n'.encode('utf-8')
+    lines = [f'commit refs/heads/{branch}\n'.encode('utf-8')]
+    if mark is not None:
+        lines.append(f'mark :{mark}\n'.encode('utf-8'))
+    lines.append(f'author {author} <{author}@example.com> {BASE_TIMESTAMP + serial * 60} +0000\n'.encode('utf-8'))
+    lines.append(f'committer {committer} {BASE_TIMESTAMP + serial * 60} +0000\n'.encode('utf-8'))
+    lines.append(f'data {len(message)}\n'.encode('utf-8') + message)
+    if parent is not None:
+        lines.append(f'from {parent if isinstance(parent, str) else ":" + str(parent)}\n'.encode('utf-8'))
+    for f in range(CONFIG["files"]):
+        content = f'{branch} {serial} {f}\n'.encode('utf-8')
+        lines.append(f'M 100644 inline src/module{f}/file{serial % 97}.txt\n'.encode('utf-8'))
+        lines.append(f'data {len(content)}\n'.encode('utf-8') + content)
+    lines.append(b'\n')
+    return b''.join(lines)
+
+
+# Generate the input repos and their forks under repos_dir/<owner>/<repo>, and what the API server says about them.
+# Returns the links of the input repos
+
+
+def generate_repos(repos_dir):
+    links = []
+    for r in range(CONFIG["repos"]):
+        owner, name = f'owner{r}', f'project{r}'
+        upstream = os.path.join(repos_dir, owner, name)
+        print(colored(f"[INFO] Generating {owner}/{name} and its {CONFIG['forks']} Forks...", 'magenta'))
+        generate_repo(upstream, owner)
+        add_api_repo(owner, name, 0, 0)
+        for f in range(CONFIG["forks"]):
+            forker = f'forker{f}'
+            fork = os.path.join(repos_dir, forker, name)
+            subprocess.run(['git', 'clone', '--bare', '--quiet', upstream, fork], check=True)
+            subprocess.run(['git', '-C', fork, 'config', 'uploadpack.allowfilter', 'true'], check=True)
+            pushed = f % 2 == 0 and CONFIG["forkcommits"] > 0
+            if pushed:
+                add_fork_commits(fork, forker)
+            add_api_repo(forker, name, 1000 + f, 2000 + f if pushed else 1000 + f, parent=f'{owner}/{name}')
+        links.append(f'https://github.com/{owner}/{name}')
+        print(colored("[DONE]", 'green'))
+    for login in [f'dev{i}' for i in range(CONFIG["contributors"])]:
+        add_api_user(login)
+    return links
+
+
+def add_api_repo(owner, name, created, pushed, parent=None):
+    full_name = f'{owner}/{name}'
+    API_REPOS[full_name] = {"owner": owner, "name": name, "created": created, "pushed": pushed,
+                            "parent": parent, "forks": []}
+    if parent:
+        API_REPOS[parent]["forks"].append(full_name)
+    API_USER_REPOS.setdefault(owner, []).append(full_name)
+    add_api_user(owner)
+
+
+def add_api_user(login):
+    API_USERS[login] = {"login": login, "email": f'{login}@example.com', "name": login.capitalize(), "location": None, "company": None,
+                        "blog": "", "bio": None, "twitter_username": None, "created_at": timestamp(0), "updated_at": timestamp(0)}
+
+
+# Stand-in GitHub REST API for what GitSearch asks: users, repos, their forks and contributors, and the repos
+# of a user. Lists are paged with Link headers, responses carry ETags and the X-RateLimit-* headers of GitHub.
+# POST /graphql answers the two GraphQL queries of --graphql, aliased user(login:) lookups and the forks of a
+# repository, with a rate limit of its own like GitHub's graphql resource
+
+
+class GitHubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(CONFIG["latency"])
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        body, next_page = self.route(parts, page)
+        payload = json.dumps(body).encode('utf-8')
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            # conditional requests answered with a 304 don't count against the rate limit
+            return self.respond(304, b'', {"ETag": etag, **self.rate_limit_headers('core', count=False)[0]})
+        headers, exceeded = self.rate_limit_headers('core', count=True)
+        if exceeded:
+            return self.respond(403, json.dumps({"message": "API rate limit exceeded"}).encode('utf-8'), headers)
+        if body is None:
+            return self.respond(404, json.dumps({"message": "Not Found"}).encode('utf-8'), headers)
+        headers["ETag"] = etag
+        if next_page:
+            headers["Link"] = f'<http://{self.headers["Host"]}{url.path}?page={page + 1}>; rel="next"'
+        self.respond(200, payload, headers)
+
+    def do_POST(self):
+        time.sleep(CONFIG["latency"])
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if urlsplit(self.path).path.rstrip('/') != '/graphql':
+            return self.respond(404, json.dumps({"message": "Not Found"}).encode('utf-8'), {})
+        if not self.headers.get('Authorization'):
+            # like GitHub, the GraphQL API can't be used without a token
+            return self.respond(401, json.dumps({"message": "This endpoint requires you to be authenticated."}).encode('utf-8'), {})
+        headers, exceeded = self.rate_limit_headers('graphql', count=True)
+        if exceeded:
+            body = {"errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}
+        else:
+            body = self.graphql(request.get("query", ""), request.get("variables") or {})
+        self.respond(200, json.dumps(body).encode('utf-8'), headers)
+
+    def graphql(self, query, variables):
+        if 'repository(' in query:
+            full_name = f'{variables.get("owner")}/{variables.get("name")}'
+            if full_name not in API_REPOS:
+                return {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND", "path": ["repository"],
+                                                                  "message": f"Could not resolve to a Repository with the name '{full_name}'."}]}
+            start = int(variables.get("cursor") or 0)
+            forks = API_REPOS[full_name]["forks"]
+            nodes = [repo_json(fork) for fork in forks[start:start + 100]]
+            return {"data": {"repository": {"forks": {
+                "pageInfo": {"hasNextPage": start + 100 < len(forks), "endCursor": str(start + len(nodes))},
+                "nodes": [{"url": fork["html_url"], "createdAt": fork["created_at"], "updatedAt": fork["updated_at"],
+                           "pushedAt": fork["pushed_at"]} for fork in nodes]}}}}
+        data, errors = {}, []
+        for alias, login in re.findall(r'(\w+)\s*:\s*user\(\s*login\s*:\s*("(?:[^"\\]|\\.)*")\s*\)', query):
+            user = API_USERS.get(json.loads(login))
+            if user is None:
+                errors.append({"type": "NOT_FOUND", "path": [alias],
+                               "message": f"Could not resolve to a User with the login of '{json.loads(login)}'."})
+                data[alias] = None
+                continue
+            data[alias] = {"login": user["login"], "email": user["email"] or "", "name": user["name"], "location": user["location"],
+                           "company": user["company"], "websiteUrl": user["blog"] or None, "bio": user["bio"] or "",
+                           "twitterUsername": user["twitter_username"], "createdAt": user["created_at"], "updatedAt": user["updated_at"]}
+        return {"data": data, **({"errors": errors} if errors else {})}
+
+    def route(self, parts, page):
+        if len(parts) == 2 and parts[0] == 'users':
+            return API_USERS.get(parts[1]), False
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'repos':
+            return self.paged([repo_json(name) for name in API_USER_REPOS.get(parts[1], [])], page)
+        full_name = '/'.join(parts[1:3])
+        if parts[0] != 'repos' or full_name not in API_REPOS:
+            return None, False
+        if len(parts) == 3:
+            return repo_json(full_name), False
+        if parts[3] == 'forks':
+            return self.paged([repo_json(fork) for fork in API_REPOS[full_name]["forks"]], page)
+        if parts[3] == 'contributors':
+            return self.paged([{"login": f'dev{i}'} for i in range(CONFIG["contributors"])], page)
+        return None, False
+
+    def paged(self, items, page):
+        return items[(page - 1) * PER_PAGE:page * PER_PAGE], page * PER_PAGE < len(items)
+
+    def rate_limit_headers(self, resource, count):
+        with API_LOCK:
+            now = time.time()
+            window = API_STATE["windows"][resource]
+            if now >= window["start"] + CONFIG["ratewindow"]:
+                window["start"], window["used"] = now, 0
+            API_STATE["requests"] += 1
+            exceeded = count and window["used"] >= CONFIG["ratelimit"]
+            if count and not exceeded:
+                window["used"] += 1
+            remaining = CONFIG["ratelimit"] - window["used"]
+            reset = int(window["start"] + CONFIG["ratewindow"]) + 1
+        return {"X-RateLimit-Limit": str(CONFIG["ratelimit"]), "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(reset), "X-RateLimit-Resource": resource}, exceeded
+
+    def respond(self, status, payload, headers):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def repo_json(full_name):
+    repo = API_REPOS[full_name]
+    api_url = f'{API_URL}/repos/{full_name}'
+    parent = repo_json(repo["parent"]) if repo["parent"] else None
+    return {"full_name": full_name, "name": repo["name"], "owner": {"login": repo["owner"]}, "html_url": f'https://github.com/{full_name}',
+            "url": api_url, "description": f'synthetic repo {full_name}', "fork": bool(parent), "parent": parent, "source": parent,
+            "created_at": timestamp(repo["created"]), "updated_at": timestamp(repo["pushed"]), "pushed_at": timestamp(repo["pushed"]),
+            "forks": len(repo["forks"]), "contributors_url": f'{api_url}/contributors'}
+
+
+# Run GitSearch once in workdir against the generated repos and the API server, and return its timings and metrics.
+# Reports and working clones of the previous run are removed; the mirror and HTTP caches are kept
+
+
+def run_gitsearch(workdir, repos_dir, links, gitsearch_args, run):
+    for path in ['reports', 'clones']:
+        shutil.rmtree(os.path.join(workdir, path), ignore_errors=True)
+    metrics_path = os.path.join(workdir, f'metrics-{run}.json')
+    env = {**os.environ, "GITHUB_API_URL": API_URL, "GITHUB_TOKENS": 'benchmark-token',
+           "GITHUB_CLONE_URL": 'file://' + os.path.abspath(repos_dir)}
+    print(colored(f"[INFO] Run {run}: GitSearch {' '.join(gitsearch_args)}...", 'magenta'))
+    started = time.perf_counter()
+    with open(os.path.join(workdir, f'run-{run}.log'), 'w', encoding='utf-8') as log:
+        returncode = subprocess.run([sys.executable, GITSEARCH, *links, '--metrics', metrics_path, *gitsearch_args],
+                                    cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    wall_seconds = time.perf_counter() - started
+    if returncode != 0 or not os.path.isfile(metrics_path):
+        print(colored(f"[ERROR] GitSearch Exited with {returncode}, See {os.path.join(workdir, f'run-{run}.log')}", 'red'))
+        return {"run": run, "returncode": returncode, "wall_seconds": wall_seconds, "metrics": None}
+    with open(metrics_path, encoding='utf-8') as metrics_file:
+        metrics = json.load(metrics_file)
+    print(colored(f"[DONE] {wall_seconds:.2f}s", 'green'))
+    return {"run": run, "returncode": returncode, "wall_seconds": wall_seconds, "metrics": metrics}
+
+
+def print_run(result, baseline):
+    metrics = result["metrics"]
+    if metrics is None:
+        return
+    table = PrettyTable(["phase", "calls", "seconds"] + (["baseline seconds", "change"] if baseline else []))
+    for phase in PHASES:
+        stats = metrics["phases"].get(phase, {"calls": 0, "seconds": 0})
+        row = [phase, stats["calls"], round(stats["seconds"], 3)]
+        if baseline:
+            before = ((baseline.get("metrics") or {}).get("phases", {}).get(phase) or {}).get("seconds")
+            row += [round(before, 3) if before else None,
+                    f'{(stats["seconds"] - before) / before * 100:+.1f}%' if before else None]
+        table.add_row(row)
+    print(colored(f'\n--------------------RUN {result["run"]} ({result["wall_seconds"]:.2f}s, GitSearch peak rss {metrics["peak_rss_mb"]} MB)--------------------\n', 'green'))
+    print(table)
+    table = PrettyTable(["clones", "count", "seconds", "bytes"])
+    for kind, stats in metrics["clones"].items():
+        table.add_row([kind, stats["count"], round(stats["seconds"], 3), stats["bytes"]])
+    print(table)
+    table = PrettyTable(["api endpoint", "calls"])
+    for endpoint, calls in sorted(metrics["api_calls"].items()):
+        table.add_row([endpoint, calls])
+    print(table)
+    rate_limit = metrics["rate_limit"]
+    print(colored(f'cache hits {dict(metrics["cache_hits"])}, lowest rate-limit remaining {rate_limit["lowest_remaining"]} of {rate_limit["limit"]}, '
+                  f'{rate_limit["rate_limited_responses"]} rate-limited responses, {rate_limit["waits"]} waits ({rate_limit["wait_seconds"]:.0f}s)', 'magenta'))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    gitsearch_args = ['--expandedsearch']
+    if '--' in args:
+        gitsearch_args = args[args.index('--') + 1:]
+        args = args[:args.index('--')]
+    for key, value in CONFIG.items():
+        if f'--{key}' in args:
+            CONFIG[key] = type(value)(args[args.index(f'--{key}') + 1])
+    output = args[args.index('--output') + 1] if '--output' in args else 'benchmark.json'
+    baseline = None
+    if '--baseline' in args:
+        with open(args[args.index('--baseline') + 1], encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    workdir = os.path.abspath(args[args.index('--workdir') + 1]) if '--workdir' in args else tempfile.mkdtemp(prefix='gitsearch-bench-')
+    repos_dir = os.path.join(workdir, 'repos')
+    shutil.rmtree(repos_dir, ignore_errors=True)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GitHubAPIHandler)
+    server.daemon_threads = True
+    API_URL = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        started = time.perf_counter()
+        links = generate_repos(repos_dir)
+        generate_seconds = time.perf_counter() - started
+        results = [run_gitsearch(workdir, repos_dir, links, gitsearch_args, run)
+                   for run in range(1, CONFIG["runs"] + 1)]
+    finally:
+        server.shutdown()
+        if '--workdir' not in args:
+            shutil.rmtree(workdir, ignore_errors=True)
+    for i, result in enumerate(results):
+        print_run(result, baseline["runs"][i] if baseline and i < len(baseline["runs"]) else None)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump({"config": CONFIG, "gitsearch_args": gitsearch_args, "generate_seconds": generate_seconds,
+                   "api_requests_served": API_STATE["requests"], "runs": results}, output_file, indent=2)
+    print(colored(f"\n[DONE] Benchmark Results Written to {output}", 'green'))
+    exit(0 if all(result["returncode"] == 0 for result in results) else 1)